@@ -0,0 +1,300 @@
+import os
+import asyncio
+import contextvars
+import math
+import time
+from collections import OrderedDict, deque
+
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from .metrics import Counter, Gauge
+from .request_timing import current_trace
+
+# Admission control for the recognition endpoints.
+# At most ADMISSION_MAX_IN_FLIGHT requests run at once; up to ADMISSION_MAX_QUEUE more wait in
+# per-client FIFO queues that are served round-robin, so one busy kiosk cannot starve the others.
+# Anything beyond that, or waiting longer than ADMISSION_QUEUE_TIMEOUT_MS, gets an immediate
+# 503 with Retry-After instead of slowing every admitted request down.
+#
+#   install_admission_control(app, ["/face/recognize", "/attendance/mark"])
+#
+# Clients are told apart by an X-Client-Id header (e.g. a kiosk id), else by their IP address.
+#
+# Latest frame wins: requests carrying an X-Session-Id header (the live-check page sends one per
+# tab) supersede older requests of the same session. A superseded request still waiting in the
+# queue is answered 409 at once; one already running stops at its next checkpoint:
+#
+#   abandoned = abandoned_response()
+#   if abandoned: return abandoned
+#
+# The same applies to requests whose client has disconnected, queued or running.
+
+MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", str(os.cpu_count() or 4))) # 0 = no limit
+MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+MAX_QUEUED_PER_CLIENT = int(os.getenv("ADMISSION_MAX_QUEUED_PER_CLIENT", "4"))
+QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_MS", "2000")) / 1000
+CLIENT_HEADER = "x-client-id"
+SESSION_HEADER = "x-session-id"
+
+IN_FLIGHT = Gauge("admission_in_flight", "Recognition requests currently running")
+QUEUED = Gauge("admission_queued", "Recognition requests waiting for a slot")
+REJECTED = Counter("admission_rejected_total", "Requests turned away with 503 (queue_full, client_limit, timeout)", ["reason"])
+ABANDONED = Counter("admission_abandoned_total", "Requests dropped before finishing (superseded, disconnected) while queued or running", ["reason", "state"])
+
+class Rejected(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class Abandoned(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+class Ticket:
+    """
+    One admitted-or-waiting request. `abandoned` is set to a reason once nobody wants its answer.
+    """
+    def __init__(self, client, session=None):
+        self.client = client
+        self.session = session
+        self.slot = None # Future while queued
+        self.running = False
+        self.abandoned = None
+
+_current_ticket = contextvars.ContextVar("admission_ticket", default=None)
+
+class AdmissionController:
+    """
+    Bounded in-flight count with fair, bounded queueing. Used from the event loop only.
+    """
+    def __init__(self, max_in_flight=MAX_IN_FLIGHT, max_queue=MAX_QUEUE,
+                 max_queued_per_client=MAX_QUEUED_PER_CLIENT, queue_timeout=QUEUE_TIMEOUT):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_queued_per_client = max_queued_per_client
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.queues = OrderedDict() # { client: deque of tickets }, next client to serve first
+        self.queued = 0
+        self.sessions = {} # { session id: its newest queued or running ticket }
+        self.service_seconds = 0.2 # Moving average, used for Retry-After
+        self.admitted = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self):
+        return self.max_in_flight > 0
+
+    def retry_after(self):
+        backlog = (self.queued + 1) * self.service_seconds / max(1, self.max_in_flight)
+        return max(1, math.ceil(backlog))
+
+    def _reject(self, reason):
+        self.rejected += 1
+        REJECTED.inc(reason=reason)
+        return Rejected(reason, self.retry_after())
+
+    async def acquire(self, ticket):
+        """
+        Waits for a slot; raises Rejected if the request should be turned away and Abandoned
+        if it was superseded or its client left while waiting.
+        """
+        if ticket.session:
+            previous = self.sessions.get(ticket.session)
+            if previous is not None:
+                self.abandon(previous, "superseded")
+        if self.in_flight < self.max_in_flight and not self.queued:
+            self._admit(ticket)
+            return
+        if self.queued >= self.max_queue:
+            raise self._reject("queue_full")
+        queue = self.queues.setdefault(ticket.client, deque())
+        if len(queue) >= self.max_queued_per_client:
+            if not queue:
+                del self.queues[ticket.client]
+            raise self._reject("client_limit")
+
+        ticket.slot = asyncio.get_running_loop().create_future()
+        queue.append(ticket)
+        self.queued += 1
+        QUEUED.set(self.queued)
+        self._track(ticket)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.slot), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.running:
+                # The slot was handed over just as we gave up; pass it on
+                self.release(ticket)
+            else:
+                self._unqueue(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                raise self._reject("timeout")
+            raise
+
+    def abandon(self, ticket, reason):
+        """
+        Drops a queued ticket right away; a running one is flagged for its next checkpoint.
+        """
+        if ticket.abandoned:
+            return
+        ticket.abandoned = reason
+        self._untrack(ticket)
+        if not ticket.running and ticket.slot is not None and not ticket.slot.done():
+            ABANDONED.inc(reason=reason, state="queued")
+            self._unqueue(ticket)
+            ticket.slot.set_exception(Abandoned(reason))
+            ticket.slot.exception() # Retrieved here so an unawaited slot never logs a warning
+
+    def _track(self, ticket):
+        if ticket.session:
+            self.sessions[ticket.session] = ticket
+
+    def _untrack(self, ticket):
+        if ticket.session and self.sessions.get(ticket.session) is ticket:
+            del self.sessions[ticket.session]
+
+    def _admit(self, ticket):
+        ticket.running = True
+        self._track(ticket)
+        self.in_flight += 1
+        self.admitted += 1
+        IN_FLIGHT.set(self.in_flight)
+
+    def _unqueue(self, ticket):
+        self._untrack(ticket)
+        queue = self.queues.get(ticket.client)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            self.queued -= 1
+            if not queue:
+                del self.queues[ticket.client]
+            QUEUED.set(self.queued)
+
+    def release(self, ticket, service_seconds=None):
+        """
+        Frees the ticket's slot and hands it to the next waiting client, round-robin.
+        """
+        if service_seconds is not None:
+            self.service_seconds = 0.8 * self.service_seconds + 0.2 * service_seconds
+        self._untrack(ticket)
+        ticket.running = False
+        self.in_flight -= 1
+        while self.in_flight < self.max_in_flight and self.queues:
+            client, queue = next(iter(self.queues.items()))
+            waiting = queue.popleft()
+            self.queued -= 1
+            if queue:
+                self.queues.move_to_end(client) # This client goes to the back of the rotation
+            else:
+                del self.queues[client]
+            if not waiting.slot.done():
+                self._admit(waiting)
+                waiting.slot.set_result(True)
+        IN_FLIGHT.set(self.in_flight)
+        QUEUED.set(self.queued)
+
+    def status(self):
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "waiting_clients": len(self.queues),
+            "sessions": len(self.sessions),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+def client_key(scope, headers):
+    if headers.get(CLIENT_HEADER):
+        return headers[CLIENT_HEADER]
+    return scope["client"][0] if scope.get("client") else "unknown"
+
+def abandoned_response():
+    """
+    409 response if the current request was superseded or its client left, else None.
+    Endpoints call this before expensive stages.
+    """
+    ticket = _current_ticket.get()
+    if ticket is None or not ticket.abandoned:
+        return None
+    ABANDONED.inc(reason=ticket.abandoned, state="running")
+    return JSONResponse(status_code=409, content={"detail": "Request abandoned", "reason": ticket.abandoned})
+
+class AdmissionMiddleware:
+    """
+    Plain ASGI middleware (rather than @app.middleware) so it can read the body up front and
+    then keep listening for the client disconnecting while the request waits or runs.
+    """
+    def __init__(self, app, controller, paths):
+        self.app = app
+        self.controller = controller
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or not self.controller.enabled:
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        ticket = Ticket(client_key(scope, headers), headers.get(SESSION_HEADER))
+        body = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body.append(message)
+            if not message.get("more_body"):
+                break
+
+        disconnected = asyncio.get_running_loop().create_future()
+        async def watch():
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                self.controller.abandon(ticket, "disconnected")
+            disconnected.set_result(message)
+        watcher = asyncio.create_task(watch())
+
+        async def replay():
+            if body:
+                return body.pop(0)
+            return await asyncio.shield(disconnected)
+
+        start = time.perf_counter()
+        try:
+            try:
+                await self.controller.acquire(ticket)
+            except Rejected as e:
+                response = JSONResponse(
+                    status_code=503,
+                    content={"detail": "Server busy, please retry shortly.", "reason": e.reason},
+                    headers={"Retry-After": str(e.retry_after)},
+                )
+                return await response(scope, replay, send)
+            except Abandoned as e:
+                response = JSONResponse(status_code=409, content={"detail": "Request abandoned", "reason": e.reason})
+                return await response(scope, replay, send)
+
+            admitted_at = time.perf_counter()
+            trace = current_trace()
+            if trace is not None:
+                trace.add("queue", (admitted_at - start) * 1000)
+            token = _current_ticket.set(ticket)
+            try:
+                await self.app(scope, replay, send)
+            finally:
+                _current_ticket.reset(token)
+                self.controller.release(ticket, time.perf_counter() - admitted_at)
+        finally:
+            watcher.cancel()
+
+def install_admission_control(app, paths, controller=None):
+    """
+    Puts `paths` behind an AdmissionController. Install before the timing middleware so that
+    queue waits show up as a Server-Timing stage.
+    """
+    controller = controller or AdmissionController()
+    app.add_middleware(AdmissionMiddleware, controller=controller, paths=paths)
+    return controller
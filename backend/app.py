@@ -1,21 +1,19 @@
 import os
-os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
-os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Body
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Body, Response, Request, Header
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-import uvicorn
 import cv2
 import numpy as np
-import mediapipe as mp
 import base64
 import shutil
 import threading
-from typing import List
+import time
+from typing import List, Optional
 from datetime import datetime
-from pymongo import MongoClient
 import glob
 from bson import ObjectId
 from dotenv import load_dotenv
@@ -24,36 +22,65 @@ load_dotenv()
 # ==== CONFIG ====
 UPLOAD_DIR = "public/uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
+THUMBNAIL_DIR = os.path.join(UPLOAD_DIR, "thumbs")
 STUDENT_IMAGES_DIR = "backend/Student_Images"
+# Keys of trusted kiosks allowed to post precomputed embeddings; edge mode is off when empty
+KIOSK_API_KEYS = {k.strip() for k in os.getenv("KIOSK_API_KEYS", "").split(",") if k.strip()}
+EDGE_MAX_BATCH = int(os.getenv("EDGE_MAX_BATCH", "64"))
 
 app = FastAPI()
 
 # Mount public directory for uploads
 app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
-from .database import students_collection, attendance_collection, admin_collection, MONGO_URI
+from .database import students_collection, async_students, async_attendance, async_admins, async_rollups, MONGO_URI
+from .face_detector import get_thread_detector, crop
+from .face_embedding import compute_histograms, pack_embedding, unpack_embedding, save_samples, samples_dir, stored_embeddings, has_current_query, RECIPES, VERSIONED_FIELD, EMBEDDING_VERSION, HIST_BINS
+from .metrics import Counter, Gauge, Histogram, render as render_metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .request_timing import timed, attach_frame, install_timing_middleware
+from .admission import install_admission_control, abandoned_response
+from .inference_pool import InferencePool
+from .readiness import Readiness
+from .thumbnails import make_thumbnails, delete_thumbnails, thumbnail_response
+from .student_listing import list_students, ensure_indexes, DEFAULT_PAGE_SIZE
+from .attendance_rollups import record_mark, range_report, parse_departments, ensure_rollup_indexes
+from .attendance_export import export_response, ensure_export_indexes
+from .bulk_enroll import start_job as start_bulk_job, get_job as get_bulk_job
+from .frame_quality import check_frame
+from .result_cache import ResultCache, frame_hash, cache_scope
 SIMILARITY_THRESHOLD = 0.45 
 
-# ==== MEDIAPIPE LAZY SETUP ====
-mp_face_detection = None
-face_detection_model = None
-
-def get_face_detector():
-    global mp_face_detection, face_detection_model
-    if face_detection_model is None:
-        print("[INFO] Initializing MediaPipe Face Detection...")
-        mp_face_detection = mp.solutions.face_detection
-        # Using model=0 for short range (ideal for selfie/webcam)
-        face_detection_model = mp_face_detection.FaceDetection(
-            model_selection=0,
-            min_detection_confidence=0.4
-        )
-    return face_detection_model
+# ==== FACE DETECTION ====
+# Backends: mediapipe_short, mediapipe_full, haar, dnn (see backend/face_detector.py)
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "mediapipe_short")
+FACE_DETECTOR_HQ = os.getenv("FACE_DETECTOR_HQ", "mediapipe_full") # Used to verify faces when marking attendance
+DETECTOR_SPECS = [(FACE_DETECTOR, 0.4), (FACE_DETECTOR_HQ, 0.5)] # (backend, min_confidence) pairs in use
 
 # ==== GLOBAL STATE ====
 known_faces = [] # List of {"name": name, "hist": histogram}
-
-print(f"[INFO] Connected to MongoDB at {MONGO_URI}")
+gallery_version = 0 # Bumped on every gallery swap; scopes the recognition result cache
+gallery_versions = {EMBEDDING_VERSION} # Embedding recipes in the gallery; older ones only while a backfill runs
+result_cache = ResultCache()
+readiness = Readiness("detectors", "gallery")
+
+# ==== METRICS ====
+STAGE_SECONDS = Histogram("recognition_stage_seconds", "Time spent in each recognition stage", ["stage"])
+RESULTS_TOTAL = Counter("recognition_results_total", "Recognition outcomes (match, reject, no_face, low_quality)", ["endpoint", "result"])
+CACHE_LOOKUPS = Counter("result_cache_lookups_total", "Recognition result cache lookups (hit, miss)", ["result"])
+QUALITY_REJECTS = Counter("frame_quality_rejects_total", "Frames rejected by the quality gate before detection", ["reason"])
+GALLERY_SIZE = Gauge("gallery_size", "Reference face samples loaded in memory")
+GALLERY_RELOAD_SECONDS = Gauge("gallery_reload_seconds", "Duration of the last gallery reload")
+
+# ==== ADMISSION CONTROL ====
+# Bounded, per-client fair queue in front of recognition; overload gets a fast 503 + Retry-After
+# and newer frames from the same X-Session-Id supersede older ones.
+# Installed before CORS so rejections still carry CORS headers (see backend/admission.py)
+admission = install_admission_control(app, ["/face/recognize", "/attendance/mark", "/attendance/mark/embeddings"])
+
+# ==== INFERENCE POOL ====
+# Detection and matching run on a fixed pool sized to the admission limit; each thread keeps its
+# own detectors, all warmed before /ready turns green (see backend/inference_pool.py)
+inference = InferencePool(admission.max_in_flight)
 
 # ==== CORS ====
 app.add_middleware(
@@ -62,13 +89,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+# Server-Timing headers + optional slow-request frame capture (see backend/request_timing.py)
+install_timing_middleware(app, ["/face/recognize", "/attendance/mark", "/attendance/mark/embeddings"])
+
 # ==== HELPER FUNCTIONS ====
 
 def get_face_embedding(image, silent=False):
     """
-    Detects face and returns a Histogram 'embedding' for comparison.
+    Detects face and returns Histogram 'embeddings' for comparison, { recipe version: hist }
+    for every version in the gallery (see face_histograms).
     """
     if image is None:
         if not silent: print("[ERROR] No image provided to get_face_embedding")
@@ -77,99 +109,232 @@ def get_face_embedding(image, silent=False):
     height, width, _ = image.shape
     # if not silent: print(f"[DEBUG] Processing image: {width}x{height}")
 
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    
-    detector = get_face_detector()
-    results = detector.process(rgb_image)
+    # Called from the threadpool; each worker thread reuses its own detector instance
+    with timed(STAGE_SECONDS, "detection"):
+        detections = get_thread_detector(FACE_DETECTOR, min_confidence=0.4).detect(image)
 
-    if not results or not results.detections:
-        if not silent: print(f"[WARNING] No face detected by MediaPipe in {width}x{height} image")
+    if not detections:
+        if not silent: print(f"[WARNING] No face detected by {FACE_DETECTOR} in {width}x{height} image")
         return None
 
-    if not silent: print(f"[INFO] Detected {len(results.detections)} face(s)")
+    if not silent: print(f"[INFO] Detected {len(detections)} face(s)")
 
-    detection = results.detections[0]
-    bboxC = detection.location_data.relative_bounding_box
-    x, y, w, h = int(bboxC.xmin * width), int(bboxC.ymin * height), int(bboxC.width * width), int(bboxC.height * height)
-    
-    x_start = max(0, x)
-    y_start = max(0, y)
-    x_end = min(width, x + w)
-    y_end = min(height, y + h)
-
-    face_crop = image[y_start:y_end, x_start:x_end]
+    face_crop = crop(image, detections[0])
     if face_crop.size == 0: return None
+    return face_histograms(face_crop)
 
-    face_crop = cv2.resize(face_crop, (128, 128))
-    hsv_crop = cv2.cvtColor(face_crop, cv2.COLOR_BGR2HSV)
-    # Using 32x32 H-S histogram for better performance/accuracy balance
-    hist = cv2.calcHist([hsv_crop], [0, 1], None, [32, 32], [0, 180, 0, 256])
-    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
-    
-    return hist
+def face_histograms(face_crop):
+    """
+    Histogram 'embeddings' of an already cropped BGR face: the current recipe, plus any older one
+    that students not yet re-embedded by a backfill are still matched on.
+    """
+    with timed(STAGE_SECONDS, "embedding"):
+        return compute_histograms(face_crop, gallery_versions)
+
+def get_face_embedding_hq(image):
+    """
+    Single detection pass with the high-quality detector; its box feeds the histogram directly.
+    Runs in the threadpool, each worker thread reusing its own detector instance.
+    Returns (detections, hists) as { version: hist }; hists is None if no usable face was found.
+    """
+    with timed(STAGE_SECONDS, "detection"):
+        detections = get_thread_detector(FACE_DETECTOR_HQ, min_confidence=0.5).detect(image)
+    if not detections:
+        return detections, None
+    face_crop = crop(image, detections[0])
+    if face_crop.size == 0:
+        return detections, None
+    return detections, face_histograms(face_crop)
 
 def load_known_faces():
-    global known_faces
-    known_faces = []
-    
-    # 1. Load from Disk
-    if os.path.exists(STUDENT_IMAGES_DIR):
-        all_files = glob.glob(os.path.join(STUDENT_IMAGES_DIR, "**", "*.*"), recursive=True)
-        valid_extensions = {".jpg", ".jpeg", ".png"}
-        img_files = [f for f in all_files if os.path.splitext(f)[1].lower() in valid_extensions]
-        
+    global known_faces, gallery_version, gallery_versions
+    reload_start = time.perf_counter()
+    # Built into a local list and swapped in at the end, so requests never see a half-loaded gallery
+    faces = []
+    readiness.start("gallery")
+
+    try:
+        # 1. Load from Disk
+        img_files = []
+        if os.path.exists(STUDENT_IMAGES_DIR):
+            all_files = glob.glob(os.path.join(STUDENT_IMAGES_DIR, "**", "*.*"), recursive=True)
+            valid_extensions = {".jpg", ".jpeg", ".png"}
+            img_files = [f for f in all_files if os.path.splitext(f)[1].lower() in valid_extensions]
+
+        embedding_query = {"$or": [{"faceEmbedding": {"$exists": True}}, {"faceEmbeddings": {"$exists": True}}]}
+        # Students the backfill has not reached yet keep being matched on their older recipe
+        outdated = students_collection.count_documents({"$and": [embedding_query, {"$nor": [has_current_query()]}]})
+        if outdated:
+            print(f"[WARNING] {outdated} students still have outdated embeddings. Run: python -m backend.embedding_backfill")
+        readiness.set_total("gallery", len(img_files) + students_collection.count_documents(embedding_query))
+
         for file_path in img_files:
             img = cv2.imread(file_path)
             if img is not None:
-                hist = get_face_embedding(img, silent=True)
-                if hist is not None:
+                hists = get_face_embedding(img, silent=True)
+                if hists is not None:
                     name = os.path.basename(os.path.dirname(file_path)) or os.path.splitext(os.path.basename(file_path))[0]
                     # Try to associate with database ID for attendance records
-                    student_doc = students_collection.find_one({"name": name})
+                    student_doc = students_collection.find_one({"name": name}, {"_id": 1})
                     student_id = str(student_doc["_id"]) if student_doc else None
-                    known_faces.append({"id": student_id, "name": name, "hist": hist})
+                    faces.append({"id": student_id, "name": name, "hist": hists[EMBEDDING_VERSION], "version": EMBEDDING_VERSION})
+            readiness.advance("gallery")
+
+        # 2. Load from Database
+        projection = {"name": 1, "faceEmbedding": 1, "faceEmbeddings": 1, "embeddingVersion": 1, VERSIONED_FIELD: 1}
+        for s in students_collection.find(embedding_query, projection):
+            try:
+                # Newest version stored (multi-sample, staged by a backfill, or legacy single-sample);
+                # packed binary or legacy lists, decoded once here, not on every match
+                version, embeddings = stored_embeddings(s)
+                if version not in RECIPES:
+                    print(f"[WARNING] Skipping {s.get('name')}: unknown embedding version {version}")
+                    embeddings = []
+                for emb in embeddings:
+                    hist = unpack_embedding(emb)
+                    faces.append({"id": str(s["_id"]), "name": s["name"], "hist": hist, "embeddings": [hist], "version": version})
+            except Exception as e:
+                print(f"[ERROR] Loading face for {s.get('name')}: {e}")
+            readiness.advance("gallery")
+    except Exception as e:
+        readiness.fail("gallery", e)
+        print(f"[ERROR] Gallery load failed: {e}")
+        return
+
+    known_faces = faces
+    gallery_versions = {f["version"] for f in faces} | {EMBEDDING_VERSION}
+    gallery_version += 1
+    readiness.finish("gallery")
+    GALLERY_SIZE.set(len(faces))
+    GALLERY_RELOAD_SECONDS.set(time.perf_counter() - reload_start)
+    print(f"[INFO] Total loaded reference faces: {len(faces)}")
+
+def warm_start():
+    """
+    Startup work kept off the event loop: detector warm-up on every inference thread, then the
+    first gallery load.
+    """
+    try:
+        inference.warm(DETECTOR_SPECS, readiness)
+    except Exception as e:
+        readiness.fail("detectors", e)
+        print(f"[ERROR] Face detector warm-up failed: {e}")
+    load_known_faces()
 
-    # 2. Load from Database
-    db_students = list(students_collection.find({"$or": [{"faceEmbedding": {"$exists": True}}, {"faceEmbeddings": {"$exists": True}}]}))
-    for s in db_students:
-        try:
-            # New Multi-Sample Schema
-            if "faceEmbeddings" in s and isinstance(s["faceEmbeddings"], list):
-                for emb in s["faceEmbeddings"]:
-                    hist = np.array(emb, dtype=np.float32).reshape(32, 32)
-                    known_faces.append({"id": str(s["_id"]), "name": s["name"], "hist": hist, "embeddings": [emb]})
-            
-            # Legacy Single-Sample Schema
-            elif "faceEmbedding" in s:
-                hist = np.array(s["faceEmbedding"], dtype=np.float32).reshape(32, 32)
-                known_faces.append({"id": str(s["_id"]), "name": s["name"], "hist": hist, "embeddings": [s["faceEmbedding"]]})
-        except Exception as e:
-            print(f"[ERROR] Loading face for {s.get('name')}: {e}")
-            continue
-            
-    print(f"[INFO] Total loaded reference faces: {len(known_faces)}")
+def find_best_match(target_embs):
+    """
+    Scans known_faces and returns (person, score) for the highest HISTCMP_CORREL score.
+    target_embs is { recipe version: live histogram }; each person is scored by their best
+    stored embedding against the live histogram of the same version.
+    """
+    best_score = 0
+    best_match = None
+    
+    # known_faces stores: { "id": str(_id), "embeddings": [32x32 float32 matrix...], "name": ..., "version": ... }
+    for person in known_faces:
+        target_emb = target_embs.get(person.get("version", EMBEDDING_VERSION))
+        if target_emb is None: continue
+        person_embeddings = person.get("embeddings", [])
+        
+        # Fallback if somehow old format lingers in memory
+        if not person_embeddings and "hist" in person:
+            local_best = cv2.compareHist(target_emb, person["hist"], cv2.HISTCMP_CORREL)
+        else:
+            # Multi-Embedding Check (Best of Max)
+            local_best = 0
+            for stored_mat in person_embeddings:
+                score = cv2.compareHist(target_emb, stored_mat, cv2.HISTCMP_CORREL)
+                if score > local_best: local_best = score
+        
+        if local_best > best_score:
+            best_score = local_best
+            best_match = person
+
+    return best_match, best_score
+
+def match_face(target_embs):
+    """
+    Timed find_best_match, for use through inference.run.
+    """
+    with timed(STAGE_SECONDS, "gallery_match"):
+        return find_best_match(target_embs)
+
+def decode_image(data_url):
+    """
+    Decodes a base64 (optionally data-URL prefixed) image into a BGR array, timing both steps.
+    Returns (raw_bytes, image); image is None if the bytes are not a valid image.
+    """
+    encoded = data_url.split(",", 1)[1] if "," in data_url else data_url
+    with timed(STAGE_SECONDS, "base64_decode"):
+        image_data = base64.b64decode(encoded)
+    attach_frame(image_data)
+    with timed(STAGE_SECONDS, "image_decode"):
+        img = cv2.imdecode(np.frombuffer(image_data, np.uint8), cv2.IMREAD_COLOR)
+    return image_data, img
+
+def check_quality(img, endpoint):
+    """
+    Frame-quality gate (see backend/frame_quality.py), run before detection.
+    """
+    with timed(STAGE_SECONDS, "quality_gate"):
+        quality = check_frame(img)
+    if not quality.ok:
+        RESULTS_TOTAL.inc(endpoint=endpoint, result="low_quality")
+        QUALITY_REJECTS.inc(reason=quality.reason)
+    return quality
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
+@app.get("/ready")
+async def ready():
+    """
+    Readiness probe: 503 until the detectors are warm and the gallery has loaded once.
+    """
+    status = readiness.status()
+    status["gallery_size"] = len(known_faces)
+    status["result_cache"] = result_cache.stats()
+    status["admission"] = admission.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/thumbs/{filename}")
+async def get_thumbnail(filename: str, request: Request):
+    return thumbnail_response(filename, request, THUMBNAIL_DIR)
+
+@app.post("/gallery/reload")
+async def reload_gallery():
+    """
+    Reloads the in-memory gallery, e.g. after an embedding backfill wrote new embeddings.
+    """
+    await run_in_threadpool(load_known_faces)
+    return {"gallery_size": len(known_faces), "embeddingVersion": EMBEDDING_VERSION}
+
+@app.get("/metrics")
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
 @app.on_event("startup")
 async def startup_event():
     print("[INFO] Cleaning up legacy database indexes...")
     try:
         # Log indexes for debugging
-        idxs = students_collection.index_information()
+        idxs = await async_students.index_information()
+        print(f"[INFO] Connected to MongoDB at {MONGO_URI}")
         print(f"[INFO] Current Student Indexes: {list(idxs.keys())}")
         
         # Drop the problematic index if it exists
         if "enrollmentNumber_1" in idxs:
-            students_collection.drop_index("enrollmentNumber_1")
+            await async_students.drop_index("enrollmentNumber_1")
             print("[INFO] Dropped legacy enrollmentNumber index.")
+        await ensure_indexes(async_students)
+        await ensure_rollup_indexes(async_rollups)
+        await ensure_export_indexes(async_attendance)
     except Exception as e:
         print(f"[DEBUG] Index cleanup note: {e}")
 
-    print("[INFO] Starting face cache loader in background...")
-    threading.Thread(target=load_known_faces, daemon=True).start()
+    print("[INFO] Warming up detectors and loading face cache in background...")
+    threading.Thread(target=warm_start, daemon=True).start()
 
 # ==== AUTH ROUTES ====
 
@@ -183,7 +348,7 @@ async def login(data: LoginRequest):
     if (data.email == "admin@sinhgad.edu" or data.email == "admin@vidya.com") and data.password == "Admin@123":
         return {"user": {"name": "Administrator", "email": data.email, "role": "admin"}}
     
-    admin = admin_collection.find_one({"email": data.email, "password": data.password})
+    admin = await async_admins.find_one({"email": data.email, "password": data.password})
     if admin:
         return {"user": {"name": admin.get("name", "Admin"), "email": admin["email"], "role": "admin"}}
     
@@ -196,7 +361,7 @@ class StudentLoginRequest(BaseModel):
 
 @app.post("/student/login")
 async def student_login(data: StudentLoginRequest):
-    student = students_collection.find_one({"email": data.email, "rollNo": data.rollNo})
+    student = await async_students.find_one({"email": data.email, "rollNo": data.rollNo})
     if not student:
         raise HTTPException(status_code=401, detail="Invalid Email or Roll Number")
     
@@ -215,18 +380,18 @@ async def student_login(data: StudentLoginRequest):
 @app.get("/student/me/{student_id}")
 async def get_student_profile(student_id: str):
     try:
-        student = students_collection.find_one({"_id": ObjectId(student_id)})
+        student = await async_students.find_one({"_id": ObjectId(student_id)})
         if not student:
              raise HTTPException(status_code=404, detail="Student not found")
         
         # Get Attendance Stats (Robust match for both string and ObjectId)
         query = {"$or": [{"studentId": student_id}, {"studentId": ObjectId(student_id)}]}
-        attendance_records = list(attendance_collection.find(query).sort("date", -1))
+        attendance_records = await async_attendance.find(query, {"date": 1, "time": 1}).sort("date", -1).to_list(None)
         
         print(f"[DEBUG] Fetching Profile for {student_id}: Found {len(attendance_records)} records")
         
         # Calculate dynamic working days (unique attendance dates in system)
-        unique_dates = attendance_collection.distinct("date")
+        unique_dates = await async_attendance.distinct("date")
         total_days = max(1, len(unique_dates)) 
         present_days = len(attendance_records)
         percentage = (present_days / total_days * 100)
@@ -238,7 +403,8 @@ async def get_student_profile(student_id: str):
                 "department": student.get("department", "General"),
                 "email": student["email"],
                 "phone": student.get("phone", ""),
-                "profileImage": student.get("profileImage", "")
+                "profileImage": student.get("profileImage", ""),
+                "thumbnails": student.get("thumbnails", {})
             },
             "stats": {
                 "totalWorkingDays": total_days,
@@ -257,13 +423,41 @@ async def get_student_profile(student_id: str):
 # ==== STUDENT ROUTES ====
 
 @app.get("/students/")
-async def get_students():
-    students = list(students_collection.find())
-    for s in students:
-        s["id"] = str(s["_id"]) # Frontend expects 'id'
-        s["_id"] = str(s["_id"])
-        if "faceEmbedding" in s: del s["faceEmbedding"]
-    return students
+async def get_students(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                       department: Optional[str] = None, q: Optional[str] = None):
+    """
+    One page of students (no embeddings), ordered by rollNo. Pass `nextCursor` back as `cursor`.
+    Optional filters: exact `department`, rollNo/name prefix `q`.
+    """
+    try:
+        return await list_students(async_students, limit, cursor, department, q)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+BULK_OPTIONS = {"mode": "embeddings", "detector": FACE_DETECTOR, "min_confidence": 0.4,
+                "upload_dir": UPLOAD_DIR, "thumbnail_dir": THUMBNAIL_DIR, "student_images_dir": None}
+
+@app.post("/students/bulk", status_code=202)
+async def bulk_enroll(roster: UploadFile = File(...), archive: UploadFile = File(...)):
+    """
+    Enrolls every student in a CSV roster from a ZIP of per-student image folders.
+    Runs in the background; poll GET /students/bulk/{id} for progress and per-row errors.
+    """
+    try:
+        # Gallery reloads once, after every student is inserted
+        job = await run_in_threadpool(start_bulk_job, roster.file, archive.file, BULK_OPTIONS, load_known_faces)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return job.status()
+
+@app.get("/students/bulk/{job_id}")
+async def bulk_enroll_status(job_id: str):
+    job = get_bulk_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Bulk import not found")
+    return job.status()
 
 class StudentAddRequest(BaseModel):
     name: str
@@ -275,9 +469,9 @@ class StudentAddRequest(BaseModel):
 
 @app.post("/students/add")
 async def add_student(student: StudentAddRequest):
-    if students_collection.find_one({"rollNo": student.rollNo}):
+    if await async_students.find_one({"rollNo": student.rollNo}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Student already exists")
-    if students_collection.find_one({"email": student.email}):
+    if await async_students.find_one({"email": student.email}, {"_id": 1}):
         raise HTTPException(status_code=400, detail="Email already registered")
 
     if not student.images:
@@ -303,7 +497,10 @@ async def add_student(student: StudentAddRequest):
     #         except: continue
 
     embeddings = []
+    samples = [] # Encoded images that produced an embedding, kept for re-embedding
     saved_profile_image = ""
+    profile_bytes = None
+    student_id = ObjectId()
     
     # Ensure upload dir exists
     os.makedirs(UPLOAD_DIR, exist_ok=True)
@@ -323,9 +520,10 @@ async def add_student(student: StudentAddRequest):
             if img is None: continue
 
             # Generate Embedding
-            emb = get_face_embedding(img, silent=True)
-            if emb is not None:
-                embeddings.append(emb.flatten().tolist())
+            embs = get_face_embedding(img, silent=True)
+            if embs is not None:
+                embeddings.append(pack_embedding(embs[EMBEDDING_VERSION]))
+                samples.append((image_data, ".jpg"))
                 
                 # Save first valid image as profile picture
                 if not saved_profile_image:
@@ -334,6 +532,7 @@ async def add_student(student: StudentAddRequest):
                     with open(filepath, "wb") as f:
                         f.write(image_data)
                     saved_profile_image = f"/uploads/{filename}"
+                    profile_bytes = image_data
             
         except Exception as e:
             print(f"[ERROR] Processing image {idx}: {e}")
@@ -342,25 +541,33 @@ async def add_student(student: StudentAddRequest):
     if not embeddings:
          raise HTTPException(status_code=400, detail="Could not detect face in any provided images")
 
+    thumbnails = await run_in_threadpool(make_thumbnails, profile_bytes, student.rollNo, THUMBNAIL_DIR)
+    await run_in_threadpool(save_samples, student_id, samples)
+
     student_data = {
+        "_id": student_id,
         "name": student.name,
         "rollNo": student.rollNo,
         "department": student.department,
         "email": student.email,
         "phone": student.phone,
         "profileImage": saved_profile_image,
+        "thumbnails": thumbnails,
         "faceEmbeddings": embeddings, # Store ARRAY of embeddings
+        "embeddingVersion": EMBEDDING_VERSION,
         "createdAt": datetime.now()
     }
     
-    result = students_collection.insert_one(student_data)
-    load_known_faces() # Reload cache
+    result = await async_students.insert_one(student_data)
+    await run_in_threadpool(load_known_faces) # Reload cache
     return {"id": str(result.inserted_id), "message": f"Student added with {len(embeddings)} face samples"}
 
 @app.delete("/students/{id}")
 async def delete_student(id: str):
-    student = students_collection.find_one({"_id": ObjectId(id)})
+    student = await async_students.find_one({"_id": ObjectId(id)}, {"rollNo": 1, "profileImage": 1})
     if student:
+        delete_thumbnails(student.get("rollNo"), THUMBNAIL_DIR)
+        shutil.rmtree(samples_dir(id), ignore_errors=True)
         # Delete Profile Image from disk
         profile_img = student.get("profileImage")
         if profile_img:
@@ -370,8 +577,8 @@ async def delete_student(id: str):
                 try: os.remove(filepath)
                 except: pass
     
-    students_collection.delete_one({"_id": ObjectId(id)})
-    load_known_faces() # Reload cache to remove deleted student
+    await async_students.delete_one({"_id": ObjectId(id)})
+    await run_in_threadpool(load_known_faces) # Reload cache to remove deleted student
     return {"message": "Deleted"}
 
 class StudentUpdateRequest(BaseModel):
@@ -390,11 +597,11 @@ async def update_student(id: str, student: StudentUpdateRequest):
 
     # Check for duplicate rollNo if changing it
     if "rollNo" in update_data:
-        existing = students_collection.find_one({"rollNo": update_data["rollNo"]})
+        existing = await async_students.find_one({"rollNo": update_data["rollNo"]}, {"_id": 1})
         if existing and str(existing["_id"]) != id:
              raise HTTPException(status_code=400, detail="Roll No already exists")
 
-    result = students_collection.update_one(
+    result = await async_students.update_one(
         {"_id": ObjectId(id)}, 
         {"$set": update_data}
     )
@@ -402,7 +609,7 @@ async def update_student(id: str, student: StudentUpdateRequest):
     if result.modified_count == 0:
          raise HTTPException(status_code=404, detail="Student not found or no changes made")
          
-    load_known_faces() # Reload cache to update changes (e.g. name)
+    await run_in_threadpool(load_known_faces) # Reload cache to update changes (e.g. name)
     return {"message": "Student updated successfully"}
 
 # ==== MODELS ====
@@ -410,10 +617,51 @@ async def update_student(id: str, student: StudentUpdateRequest):
 class AttendanceRequest(BaseModel):
     image: str
 
+class EdgeEmbedding(BaseModel):
+    embedding: str # Base64 of a packed embedding (see backend/face_embedding.py)
+    source: Optional[str] = None # Camera name on the kiosk, echoed back
+
+class EdgeBatchRequest(BaseModel):
+    embeddingVersion: int
+    items: List[EdgeEmbedding]
+
+async def record_attendance(student):
+    """
+    Records today's attendance for a student unless already marked. Returns True if newly marked.
+    """
+    today = datetime.now().strftime("%Y-%m-%d")
+    # Robust check for existing record (string or ObjectId)
+    existing_query = {
+        "$or": [{"studentId": str(student["_id"])}, {"studentId": student["_id"]}],
+        "date": today
+    }
+    with timed(STAGE_SECONDS, "mongo_read"):
+        existing = await async_attendance.find_one(existing_query, {"_id": 1})
+    print(f"[DEBUG] Check Existing for {student['name']}: {'Found' if existing else 'Not Found'}")
+
+    if existing:
+        print(f"[DEBUG] {student['name']} already marked today.")
+        return False
+
+    new_record = {
+        "studentId": str(student["_id"]),
+        "studentName": student["name"],
+        "rollNo": student["rollNo"],
+        "department": student.get("department", "General"),
+        "date": today,
+        "time": datetime.now().strftime("%H:%M:%S"),
+        "status": "Present"
+    }
+    with timed(STAGE_SECONDS, "mongo_write"):
+        res = await async_attendance.insert_one(new_record)
+        await record_mark(async_rollups, today, new_record["department"], new_record["studentId"])
+    print(f"[DEBUG] Inserted new record for {student['name']}. ID: {res.inserted_id}")
+    return True
+
 # ==== FACE RECOGNITION (LIVE CHECK) ROUTE ====
 
 @app.post("/face/recognize")
-async def recognize_face(data: AttendanceRequest):
+async def recognize_face(data: AttendanceRequest, request: Request):
     """
     Stand-alone recognition endpoint for 'Live Check' page.
     Does NOT mark attendance.
@@ -422,42 +670,56 @@ async def recognize_face(data: AttendanceRequest):
         raise HTTPException(status_code=400, detail="No image")
 
     try:
-        encoded = data.image.split(",", 1)[1] if "," in data.image else data.image
-        np_arr = np.frombuffer(base64.b64decode(encoded), np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        _, img = decode_image(data.image)
 
         if img is None: raise HTTPException(status_code=400, detail="Invalid Image")
 
-        target_emb = get_face_embedding(img, silent=True)
-        if target_emb is None:
-             return {"status": "fail", "message": "No face detected"}
-
-        best_score = 0
-        best_match = None
-        
-        for person in known_faces:
-            local_best = 0
-            for emb_list in person.get("embeddings", []):
-                stored_mat = np.array(emb_list, dtype=np.float32).reshape((32, 32))
-                score = cv2.compareHist(target_emb, stored_mat, cv2.HISTCMP_CORREL)
-                if score > local_best: local_best = score
-            
-            if local_best > best_score:
-                best_score = local_best
-                best_match = person
-
-        if best_match and best_score > SIMILARITY_THRESHOLD:
-            # Fetch full details if needed, but for now just return the name/id
-            return {
-                "status": "success",
-                "student": {
-                    "name": best_match["name"],
-                    "id": best_match["id"],
-                },
-                "score": round(best_score, 2)
-            }
-        
-        return {"status": "fail", "message": "Unknown Student", "score": round(best_score, 2)}
+        quality = check_quality(img, "recognize")
+        if not quality.ok:
+            return {"status": "fail", "message": quality.message, "reason": quality.reason, "quality": quality.metrics()}
+
+        # Near-duplicate of a recent frame: reuse its result (see backend/result_cache.py)
+        version = gallery_version
+        if result_cache.enabled:
+            with timed(STAGE_SECONDS, "result_cache"):
+                cache_key, scope = frame_hash(img), cache_scope(request)
+                cached = result_cache.get(cache_key, version, scope)
+            CACHE_LOOKUPS.inc(result="hit" if cached else "miss")
+            if cached:
+                RESULTS_TOTAL.inc(endpoint="recognize", result=cached["outcome"])
+                return {**cached["response"], "cached": True}
+
+        # Detection and the gallery scan run off the event loop, so admission control bounds them
+        # and one slow frame cannot stall other requests
+        target_embs = await inference.run(get_face_embedding, img, True)
+
+        # Superseded by a newer frame from the same session, or the client left during detection
+        # (see backend/admission.py)
+        abandoned = abandoned_response()
+        if abandoned: return abandoned
+
+        if target_embs is None:
+            outcome, response = "no_face", {"status": "fail", "message": "No face detected"}
+        else:
+            best_match, best_score = await inference.run(match_face, target_embs)
+
+            if best_match and best_score > SIMILARITY_THRESHOLD:
+                # Fetch full details if needed, but for now just return the name/id
+                outcome, response = "match", {
+                    "status": "success",
+                    "student": {
+                        "name": best_match["name"],
+                        "id": best_match["id"],
+                    },
+                    "score": round(best_score, 2)
+                }
+            else:
+                outcome, response = "reject", {"status": "fail", "message": "Unknown Student", "score": round(best_score, 2)}
+
+        RESULTS_TOTAL.inc(endpoint="recognize", result=outcome)
+        if result_cache.enabled:
+            result_cache.put(cache_key, version, {"outcome": outcome, "response": response}, scope)
+        return response
 
     except Exception as e:
         print(f"Recognition Error: {e}")
@@ -470,103 +732,61 @@ async def mark_attendance(data: AttendanceRequest):
         raise HTTPException(status_code=400, detail="No image")
 
     try:
-        encoded = data.image.split(",", 1)[1] if "," in data.image else data.image
-        image_data = base64.b64decode(encoded)
-        np_arr = np.frombuffer(image_data, np.uint8)
-        img = cv2.imdecode(np_arr, cv2.IMREAD_COLOR)
+        _, img = decode_image(data.image)
 
         if img is None: raise HTTPException(status_code=400, detail="Invalid Image")
 
-        # Use High-Quality Detection for Verification
-        detector_hq = mp.solutions.face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5)
-        results = detector_hq.process(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        quality = check_quality(img, "mark")
+        if not quality.ok:
+            return JSONResponse(status_code=400, content={"detail": quality.message, "reason": quality.reason, "quality": quality.metrics()})
+
+        # High-Quality Detection for Verification; the same box is used for the embedding
+        hq_detections, target_embs = await inference.run(get_face_embedding_hq, img)
         
-        if not results.detections:
-             detector_hq.close()
+        if not hq_detections:
+             RESULTS_TOTAL.inc(endpoint="mark", result="no_face")
              raise HTTPException(status_code=400, detail="No face detected. Please position better.")
         
-        # Get target embedding
-        # We need a robust embedding. Re-using the utility function but ensuring it uses the cropped face
-        target_emb = get_face_embedding(img, silent=True)
-        if target_emb is None:
+        if target_embs is None:
+             RESULTS_TOTAL.inc(endpoint="mark", result="no_face")
              raise HTTPException(status_code=400, detail="Face quality too low")
 
-        best_score = 0
-        best_match_id = None
-        
-        # known_faces stores: { "id": str(_id), "embeddings": [list...], "name": ... }
-        for person in known_faces:
-            # We compare against all stored embeddings for this person
-            person_embeddings = person.get("embeddings", [])
-            
-            # Legacy support (single 'hist' key?) - No, we migrated everything to standard list
-            if not person_embeddings and "hist" in person:
-                 # Fallback if somehow old format lingers in memory
-                 score = cv2.compareHist(target_emb, person["hist"], cv2.HISTCMP_CORREL)
-                 if score > best_score:
-                    best_score = score
-                    best_match_id = person.get("id")
-            
-            # New Multi-Embedding Check (Best of Max)
-            local_best = 0
-            for emb_list in person_embeddings:
-                stored_mat = np.array(emb_list, dtype=np.float32).reshape((32, 32))
-                score = cv2.compareHist(target_emb, stored_mat, cv2.HISTCMP_CORREL)
-                if score > local_best: local_best = score
-            
-            if local_best > best_score:
-                best_score = local_best
-                best_match_id = person.get("id")
+        # Superseded by a newer frame from the same session, or the client left during detection
+        # (see backend/admission.py)
+        abandoned = abandoned_response()
+        if abandoned: return abandoned
 
-        detector_hq.close()
+        best_match, best_score = await inference.run(match_face, target_embs)
+        best_match_id = best_match.get("id") if best_match else None
 
         print(f"[FACE AUTH] Best Match ID: {best_match_id} | Score: {best_score:.4f} | Threshold: {SIMILARITY_THRESHOLD}")
 
         if best_match_id and best_score > SIMILARITY_THRESHOLD:
             # Fetch Student Details
-            student = students_collection.find_one({"_id": ObjectId(best_match_id)})
+            with timed(STAGE_SECONDS, "mongo_read"):
+                student = await async_students.find_one({"_id": ObjectId(best_match_id)})
             if not student:
                 print(f"[ERROR] Matched ID {best_match_id} but not in DB")
                 raise HTTPException(status_code=404, detail="Student record not found")
+            RESULTS_TOTAL.inc(endpoint="mark", result="match")
         else:
+             RESULTS_TOTAL.inc(endpoint="mark", result="reject")
              print(f"[AUTH FAIL] Best Score: {best_score} vs Threshold {SIMILARITY_THRESHOLD}")
              msg = f"Face Not Recognized. Score: {best_score:.2f} (Needs {SIMILARITY_THRESHOLD}). Try better lighting."
              if len(known_faces) == 0:
                  msg = "System Error: No student faces loaded in database. Restart Backend."
              raise HTTPException(status_code=401, detail=msg)
 
-        today = datetime.now().strftime("%Y-%m-%d")
-        # Robust check for existing record (string or ObjectId)
-        existing_query = {
-            "$or": [{"studentId": str(student["_id"])}, {"studentId": student["_id"]}], 
-            "date": today
+        # Checked again right before the write, after the match and the student lookup
+        abandoned = abandoned_response()
+        if abandoned: return abandoned
+
+        marked = await record_attendance(student)
+        return {
+            "status": "success",
+            "message": f"{'Attendance Marked' if marked else 'Already Marked'}: {student['name']}",
+            "student": {"name": student["name"], "rollNo": student["rollNo"]}
         }
-        existing = attendance_collection.find_one(existing_query)
-        print(f"[DEBUG] Check Existing for {student['name']}: {'Found' if existing else 'Not Found'}")
-        
-        if not existing:
-            new_record = {
-                "studentId": str(student["_id"]), 
-                "studentName": student["name"],
-                "rollNo": student["rollNo"],
-                "date": today,
-                "time": datetime.now().strftime("%H:%M:%S"),
-                "status": "Present"
-            }
-            res = attendance_collection.insert_one(new_record)
-            print(f"[DEBUG] Inserted new record for {student['name']}. ID: {res.inserted_id}")
-            return {
-                "status": "success", 
-                "message": f"Attendance Marked: {student['name']}",
-                "student": {"name": student["name"], "rollNo": student["rollNo"]}
-            }
-        else:
-            print(f"[DEBUG] {student['name']} already marked today.")
-            return {
-                "status": "success", 
-                "message": f"Already Marked: {student['name']}",
-                "student": {"name": student["name"], "rollNo": student["rollNo"]}
-            }
 
     except HTTPException as he:
         raise he
@@ -574,10 +794,77 @@ async def mark_attendance(data: AttendanceRequest):
         print(f"Error marking attendance: {e}")
         raise HTTPException(status_code=500, detail="Server Error Processing Image")
 
+# ==== EDGE EMBEDDINGS ROUTE ====
+# Trusted kiosks (`standalone_attendance.py --server`) detect and embed faces themselves and post
+# batches of packed embeddings; the server only matches them and records attendance.
+
+def match_edge_batch(items):
+    """
+    Returns (best_match, best_score) per item; best_score is None for an undecodable embedding.
+    """
+    matched = []
+    with timed(STAGE_SECONDS, "gallery_match"):
+        for item in items:
+            try:
+                target_emb = unpack_embedding(base64.b64decode(item.embedding, validate=True))
+            except Exception:
+                target_emb = None
+            if target_emb is None or target_emb.shape != tuple(HIST_BINS):
+                matched.append((None, None))
+            else:
+                # Kiosks send current-version embeddings only; students still on an older
+                # recipe are matched once the backfill reaches them
+                matched.append(find_best_match({EMBEDDING_VERSION: target_emb}))
+    return matched
+
+@app.post("/attendance/mark/embeddings")
+async def mark_embeddings(data: EdgeBatchRequest, x_kiosk_key: Optional[str] = Header(None)):
+    if not KIOSK_API_KEYS:
+        raise HTTPException(status_code=403, detail="Edge embedding mode is disabled. Set KIOSK_API_KEYS.")
+    if x_kiosk_key not in KIOSK_API_KEYS:
+        raise HTTPException(status_code=401, detail="Unknown kiosk key")
+    # Histograms from another recipe would match garbage; the kiosk must be updated instead
+    if data.embeddingVersion != EMBEDDING_VERSION:
+        return JSONResponse(status_code=409, content={"detail": f"Embedding version {data.embeddingVersion} not accepted", "expected": EMBEDDING_VERSION})
+    if len(data.items) > EDGE_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {EDGE_MAX_BATCH} embeddings per batch")
+
+    # The whole batch is decoded and matched in one threadpool call, off the event loop
+    results, matches = [], {}
+    for item, (best_match, best_score) in zip(data.items, await inference.run(match_edge_batch, data.items)):
+        if best_score is None:
+            results.append({"source": item.source, "status": "error", "message": "Invalid embedding"})
+            continue
+
+        if best_match and best_match.get("id") and best_score > SIMILARITY_THRESHOLD:
+            RESULTS_TOTAL.inc(endpoint="edge", result="match")
+            matches.setdefault(best_match["id"], []).append(len(results))
+            results.append({"source": item.source, "status": "success", "score": round(best_score, 2)})
+        else:
+            RESULTS_TOTAL.inc(endpoint="edge", result="reject")
+            results.append({"source": item.source, "status": "fail", "message": "Unknown Student", "score": round(best_score, 2)})
+
+    if matches:
+        # One students query per batch; a student seen by several cameras is marked once
+        with timed(STAGE_SECONDS, "mongo_read"):
+            students = await async_students.find({"_id": {"$in": [ObjectId(i) for i in matches if ObjectId.is_valid(i)]}}).to_list(None)
+        found = {str(s["_id"]): s for s in students}
+        for student_id, positions in matches.items():
+            student = found.get(student_id)
+            marked = await record_attendance(student) if student else False
+            for n, pos in enumerate(positions):
+                if student is None:
+                    results[pos].update(status="error", message="Student record not found")
+                    continue
+                results[pos]["student"] = {"id": student_id, "name": student["name"], "rollNo": student["rollNo"]}
+                results[pos]["message"] = f"{'Attendance Marked' if marked and n == 0 else 'Already Marked'}: {student['name']}"
+
+    return {"embeddingVersion": EMBEDDING_VERSION, "results": results}
+
 @app.get("/attendance/today")
 async def get_today():
     today = datetime.now().strftime("%Y-%m-%d")
-    records = list(attendance_collection.find({"date": today}))
+    records = await async_attendance.find({"date": today}).to_list(None)
     print(f"[DEBUG] Today's Attendance Request: Found {len(records)} records for {today}")
     
     # Manual serialization to ensure no ObjectId leaks
@@ -590,11 +877,32 @@ async def get_today():
         
     return cleaned_records
 
+@app.get("/attendance/report")
+async def attendance_report(start: str, end: str, department: Optional[str] = None, perStudent: bool = True):
+    """
+    Date-range report (YYYY-MM-DD, inclusive) from the daily rollups.
+    `department` takes one or more comma-separated names; `perStudent=false` skips the per-student rows.
+    """
+    try:
+        return await range_report(async_rollups, async_students, start, end, parse_departments(department), perStudent)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/attendance/export")
+async def export_attendance(start: str, end: str, department: Optional[str] = None, format: str = "csv"):
+    """
+    Streams attendance rows for a date range as CSV (default) or Parquet.
+    """
+    try:
+        return export_response(async_attendance, async_students, start, end, parse_departments(department), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/attendance/stats")
 async def get_stats():
     today = datetime.now().strftime("%Y-%m-%d")
-    total = students_collection.count_documents({})
-    present = attendance_collection.count_documents({"date": today})
+    total = await async_students.count_documents({})
+    present = await async_attendance.count_documents({"date": today})
     print(f"[DEBUG] Stats Request - Today: {today} | Total: {total} | Present: {present}")
     return {
         "totalStudents": total,
@@ -604,4 +912,5 @@ async def get_stats():
     }
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
@@ -0,0 +1,116 @@
+import csv
+import io
+
+from bson import ObjectId
+from fastapi.responses import StreamingResponse
+from pymongo import ASCENDING
+
+from .attendance_rollups import parse_date, DEFAULT_DEPARTMENT
+
+# Streaming attendance export for large date ranges.
+# Rows come straight off an async Mongo cursor and are written out in small batches,
+# so memory stays flat however many rows are exported.
+#
+#   GET /attendance/export?start=2024-01-01&end=2024-06-30&department=IT&format=csv
+#
+# format=parquet needs pyarrow (pip install pyarrow); each batch becomes one row group.
+
+EXPORT_FIELDS = ["date", "time", "rollNo", "studentName", "department", "studentId", "status"]
+FORMATS = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+BATCH_ROWS = 5000 # Rows per cursor batch, CSV flush and Parquet row group
+
+async def ensure_export_indexes(attendance):
+    await attendance.create_index([("date", ASCENDING), ("time", ASCENDING)], name="date_1_time_1")
+
+async def _department_lookup(students):
+    # Attendance rows written before rollups carry no department; use the student's current one
+    lookup = {}
+    async for s in students.find({}, {"department": 1}):
+        lookup[str(s["_id"])] = s.get("department") or DEFAULT_DEPARTMENT
+    return lookup
+
+async def export_rows(attendance, students, start, end, departments=None):
+    lookup = await _department_lookup(students)
+    query = {"date": {"$gte": start, "$lte": end}}
+    if departments:
+        legacy_ids = [sid for sid, dept in lookup.items() if dept in departments]
+        legacy_ids += [ObjectId(sid) for sid in legacy_ids] # studentId was stored both ways
+        query["$or"] = [
+            {"department": {"$in": departments}},
+            {"department": {"$exists": False}, "studentId": {"$in": legacy_ids}},
+        ]
+
+    cursor = attendance.find(query, {field: 1 for field in EXPORT_FIELDS}).sort(
+        [("date", ASCENDING), ("time", ASCENDING)]).batch_size(BATCH_ROWS)
+    async for r in cursor:
+        student_id = str(r.get("studentId", ""))
+        yield {
+            "date": r.get("date", ""),
+            "time": r.get("time", ""),
+            "rollNo": r.get("rollNo", ""),
+            "studentName": r.get("studentName", ""),
+            "department": r.get("department") or lookup.get(student_id, DEFAULT_DEPARTMENT),
+            "studentId": student_id,
+            "status": r.get("status", "Present"),
+        }
+
+async def csv_stream(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    count = 0
+    async for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count % BATCH_ROWS == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+async def parquet_stream(rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(field, pa.string()) for field in EXPORT_FIELDS])
+    sink = io.BytesIO()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_ROWS:
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            batch = []
+            yield drain()
+    if batch:
+        writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+    writer.close()
+    yield drain()
+
+def export_response(attendance, students, start, end, departments=None, fmt="csv"):
+    """
+    Validates the request and returns a StreamingResponse; raises ValueError for bad input.
+    """
+    start, end = parse_date(start, "start"), parse_date(end, "end")
+    if start > end:
+        raise ValueError("start must not be after end")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(FORMATS)}")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet # noqa: F401
+        except ImportError:
+            raise ValueError("Parquet export needs pyarrow installed on the server; use format=csv")
+
+    rows = export_rows(attendance, students, start, end, departments)
+    body = parquet_stream(rows) if fmt == "parquet" else csv_stream(rows)
+    filename = f"attendance_{start}_{end}.{fmt}"
+    return StreamingResponse(body, media_type=FORMATS[fmt],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
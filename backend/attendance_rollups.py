@@ -0,0 +1,168 @@
+import argparse
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+# Daily attendance rollups for date-range reports.
+# One document per (date, department) holds the ids of the students marked present that day:
+#
+#   {"_id": "2024-03-01|IT", "date": "2024-03-01", "department": "IT", "studentIds": ["65f...", ...]}
+#
+# mark_attendance updates it incrementally ($addToSet, so repeated marks count once), and
+# reports read days x departments documents instead of raw attendance rows.
+# Rebuild from the attendance collection (e.g. after importing old records) with:
+#   python -m backend.attendance_rollups rebuild [--start 2024-01-01] [--end 2024-06-30]
+
+DATE_FORMAT = "%Y-%m-%d"
+DEFAULT_DEPARTMENT = "General"
+
+def rollup_key(date, department):
+    return f"{date}|{department}"
+
+def parse_date(value, field):
+    try:
+        return datetime.strptime(value, DATE_FORMAT).strftime(DATE_FORMAT)
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} must be a date in YYYY-MM-DD format")
+
+def parse_departments(value):
+    """
+    "IT,CS" -> ["IT", "CS"]; empty -> None (all departments).
+    """
+    departments = [d.strip() for d in (value or "").split(",") if d.strip()]
+    return departments or None
+
+def _mark_update(date, department, student_id):
+    department = department or DEFAULT_DEPARTMENT
+    return (
+        {"_id": rollup_key(date, department)},
+        {"$addToSet": {"studentIds": student_id}, "$setOnInsert": {"date": date, "department": department}},
+    )
+
+async def record_mark(rollups, date, department, student_id):
+    await rollups.update_one(*_mark_update(date, department, student_id), upsert=True)
+
+def record_mark_sync(rollups, date, department, student_id):
+    """
+    record_mark for a synchronous (pymongo) collection, as used by the standalone kiosk.
+    """
+    rollups.update_one(*_mark_update(date, department, student_id), upsert=True)
+
+async def ensure_rollup_indexes(rollups):
+    await rollups.create_index([("date", ASCENDING), ("department", ASCENDING)], name="date_1_department_1")
+
+async def range_report(rollups, students, start, end, departments=None, per_student=True):
+    """
+    Attendance summary between start and end (inclusive), optionally limited to departments.
+    Working days are the dates on which any attendance was taken, institution-wide.
+    """
+    start, end = parse_date(start, "start"), parse_date(end, "end")
+    if start > end:
+        raise ValueError("start must not be after end")
+
+    date_range = {"date": {"$gte": start, "$lte": end}}
+    working_days = len(await rollups.distinct("date", date_range))
+
+    query = dict(date_range)
+    if departments:
+        query["department"] = {"$in": departments}
+    docs = await rollups.find(query, {"date": 1, "department": 1, "studentIds": 1}).sort(
+        [("date", ASCENDING), ("department", ASCENDING)]).to_list(None)
+
+    daily = []
+    present_days = Counter() # { student_id: days present }
+    marks_by_department = Counter()
+    for doc in docs:
+        ids = doc.get("studentIds", [])
+        daily.append({"date": doc["date"], "department": doc["department"], "present": len(ids)})
+        present_days.update(ids)
+        marks_by_department[doc["department"]] += len(ids)
+
+    student_query = {"department": {"$in": departments}} if departments else {}
+    enrolled = Counter()
+    student_rows = []
+    if per_student:
+        async for s in students.find(student_query, {"name": 1, "rollNo": 1, "department": 1}):
+            department = s.get("department") or DEFAULT_DEPARTMENT
+            enrolled[department] += 1
+            days = present_days.get(str(s["_id"]), 0)
+            student_rows.append({
+                "id": str(s["_id"]),
+                "name": s.get("name"),
+                "rollNo": s.get("rollNo"),
+                "department": department,
+                "presentDays": days,
+                "absentDays": max(0, working_days - days),
+                "percentage": round(days / working_days * 100, 1) if working_days else 0,
+            })
+        student_rows.sort(key=lambda r: (r["department"], r["rollNo"] or ""))
+    else:
+        for department in (departments or sorted(set(marks_by_department))):
+            enrolled[department] = await students.count_documents({"department": department})
+
+    summary = []
+    for department in sorted(set(enrolled) | set(marks_by_department)):
+        possible = enrolled[department] * working_days
+        summary.append({
+            "department": department,
+            "enrolled": enrolled[department],
+            "presentMarks": marks_by_department[department],
+            "averagePercentage": round(marks_by_department[department] / possible * 100, 1) if possible else 0,
+        })
+
+    report = {"start": start, "end": end, "workingDays": working_days, "departments": summary, "daily": daily}
+    if per_student:
+        report["students"] = student_rows
+    return report
+
+# ==== REBUILD ====
+
+def rebuild(start=None, end=None):
+    """
+    Recomputes rollups from the attendance collection for a date range (default: everything).
+    Run while no attendance is being marked; marks made during the rebuild may be overwritten.
+    """
+    from .database import students_collection, attendance_collection, rollup_collection
+
+    date_range = {}
+    if start: date_range["$gte"] = parse_date(start, "start")
+    if end: date_range["$lte"] = parse_date(end, "end")
+    query = {"date": date_range} if date_range else {}
+
+    # Older records carry no department; fall back to the student's current one
+    student_departments = {
+        str(s["_id"]): s.get("department") or DEFAULT_DEPARTMENT
+        for s in students_collection.find({}, {"department": 1})
+    }
+
+    days = defaultdict(set) # { (date, department): {student_id} }
+    rows = 0
+    for record in attendance_collection.find(query, {"studentId": 1, "date": 1, "department": 1}).batch_size(5000):
+        student_id = str(record.get("studentId"))
+        department = record.get("department") or student_departments.get(student_id, DEFAULT_DEPARTMENT)
+        days[(record["date"], department)].add(student_id)
+        rows += 1
+
+    for (date, department), ids in days.items():
+        rollup_collection.update_one(
+            {"_id": rollup_key(date, department)},
+            {"$set": {"date": date, "department": department, "studentIds": sorted(ids)}},
+            upsert=True,
+        )
+    keep = [rollup_key(date, department) for date, department in days]
+    stale = rollup_collection.delete_many({**query, "_id": {"$nin": keep}}).deleted_count
+    print(f"[INFO] Rebuilt {len(days)} daily rollups from {rows} attendance records ({stale} stale removed).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily attendance rollups")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="Recompute rollups from the attendance collection")
+    rb.add_argument("--start", help="First date (YYYY-MM-DD), default: earliest")
+    rb.add_argument("--end", help="Last date (YYYY-MM-DD), default: latest")
+    args = parser.parse_args()
+    if args.command == "rebuild":
+        rebuild(args.start, args.end)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import os
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from . import memory_mongo
+
+# Matcher micro-benchmarks on synthetic galleries. No camera, MongoDB or server needed.
+#
+#   python -m backend.benchmarks.bench_matcher --out bench.json
+#   python -m backend.benchmarks.bench_matcher --compare old.json new.json
+#
+# Benchmarks:
+#   embedding    app.get_face_embedding on one frame (detector + 32x32 H-S histogram)
+#   gallery_load app.load_known_faces from the in-memory Mongo stand-in (packed embeddings; --legacy-lists for lists)
+#   match_loop   app.find_best_match over known_faces (one query)
+#   lbph_predict app_team recognizer.predict on a 100x100 ROI
+#
+# LBPH keeps a 16384-float histogram per training sample (64 KB), so its sizes are
+# capped by --lbph-max-size to keep memory bounded.
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+DEFAULT_FACE_IMAGE = "public/Students/Saurav_Deepak_Patil.jpg"
+# Distinct synthetic embeddings; larger galleries reuse them (match cost does not depend on values)
+EMBEDDING_POOL = 1000
+
+def _timeit(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "mean_ms": round(float(np.mean(samples)), 4),
+        "p50_ms": round(float(np.percentile(samples, 50)), 4),
+        "p95_ms": round(float(np.percentile(samples, 95)), 4),
+        "min_ms": round(float(np.min(samples)), 4),
+    }
+
+def synthetic_histograms(count, seed=0):
+    """
+    Returns `count` 32x32 H-S histograms normalized like get_face_embedding.
+    """
+    rng = np.random.default_rng(seed)
+    hists = rng.gamma(0.3, 1.0, size=(count, 32, 32)).astype(np.float32)
+    for h in hists:
+        cv2.normalize(h, h, 0, 1, cv2.NORM_MINMAX)
+    return hists
+
+def synthetic_rois(count, seed=0):
+    """
+    Returns `count` 100x100 grayscale ROIs (smoothed noise so LBP codes vary realistically).
+    """
+    rng = np.random.default_rng(seed)
+    rois = rng.integers(0, 256, size=(count, 100, 100), dtype=np.uint8)
+    return [cv2.GaussianBlur(r, (5, 5), 0) for r in rois]
+
+def seed_gallery(db, size, samples_per_student=1, legacy_lists=False):
+    from backend.face_embedding import pack_embedding
+    hists = synthetic_histograms(min(size, EMBEDDING_POOL))
+    pool = [h.flatten().tolist() if legacy_lists else pack_embedding(h) for h in hists]
+    students = db["students"]
+    students.docs = []
+    for i in range(size):
+        students.insert_one({
+            "name": f"Student {i}",
+            "rollNo": f"BENCH-{i:06d}",
+            "department": "BENCH",
+            "email": f"bench{i}@example.com",
+            "phone": "0000000000",
+            "faceEmbeddings": [pool[(i * samples_per_student + k) % len(pool)] for k in range(samples_per_student)],
+        })
+
+def bench_embedding(app_module, face_image, repeat):
+    img = cv2.imread(face_image) if face_image and os.path.exists(face_image) else None
+    if img is None:
+        # No face in it; still times decode-free detection + the "no face" path
+        img = np.random.default_rng(0).integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+        source = "synthetic-noise"
+    else:
+        source = face_image
+    app_module.get_face_embedding(img, silent=True) # Warm-up detector graph
+    result = _timeit(lambda: app_module.get_face_embedding(img, silent=True), repeat)
+    result.update({"bench": "embedding", "gallery_size": 0, "input": source})
+    return result
+
+def bench_gallery(app_module, db, size, samples, repeat, legacy_lists=False):
+    seed_gallery(db, size, samples, legacy_lists)
+    load = _timeit(app_module.load_known_faces, max(1, min(repeat, 3)))
+    load.update({"bench": "gallery_load", "gallery_size": size, "samples_per_student": samples})
+
+    query = synthetic_histograms(1, seed=99)[0]
+    match = _timeit(lambda: app_module.find_best_match({app_module.EMBEDDING_VERSION: query}), repeat)
+    match.update({"bench": "match_loop", "gallery_size": size, "samples_per_student": samples})
+    return [load, match]
+
+def bench_lbph(size, repeat):
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    rois = synthetic_rois(min(size, EMBEDDING_POOL))
+    faces = [rois[i % len(rois)] for i in range(size)]
+    labels = np.arange(size) // 5 # 5 samples per student
+    start = time.perf_counter()
+    recognizer.train(faces, labels)
+    train_ms = (time.perf_counter() - start) * 1000
+
+    query = synthetic_rois(1, seed=99)[0]
+    result = _timeit(lambda: recognizer.predict(query), repeat)
+    result.update({"bench": "lbph_predict", "gallery_size": size, "train_ms": round(train_ms, 2)})
+    return result
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+def run(sizes, lbph_max_size, samples, repeat, face_image, legacy_lists=False):
+    db = memory_mongo.install()
+    # Imported after install() so the app binds to the in-memory collections
+    from backend import app as app_module
+    app_module.STUDENT_IMAGES_DIR = os.path.join("backend", "benchmarks", "_no_disk_gallery")
+
+    results = [bench_embedding(app_module, face_image, repeat)]
+    for size in sizes:
+        print(f"[BENCH] gallery size {size}...", file=sys.stderr)
+        results.extend(bench_gallery(app_module, db, size, samples, repeat, legacy_lists))
+        if hasattr(cv2, "face") and size <= lbph_max_size:
+            results.append(bench_lbph(size, repeat))
+
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+def compare(old_path, new_path):
+    with open(old_path) as f: old = json.load(f)
+    with open(new_path) as f: new = json.load(f)
+    key = lambda r: (r["bench"], r["gallery_size"])
+    old_by_key = {key(r): r for r in old["results"]}
+    print(f"{'bench':<14} {'size':>7} {'old p50':>10} {'new p50':>10} {'change':>8}   ({old.get('commit')} -> {new.get('commit')})")
+    for r in new["results"]:
+        o = old_by_key.get(key(r))
+        if not o: continue
+        change = (r["p50_ms"] / o["p50_ms"] - 1) * 100 if o["p50_ms"] else 0.0
+        print(f"{r['bench']:<14} {r['gallery_size']:>7} {o['p50_ms']:>10.3f} {r['p50_ms']:>10.3f} {change:>+7.1f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description="Matcher micro-benchmarks on synthetic galleries")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Comma-separated gallery sizes (students)")
+    parser.add_argument("--lbph-max-size", type=int, default=10000, help="Skip LBPH for galleries above this many samples")
+    parser.add_argument("--samples", type=int, default=1, help="Stored embeddings per student")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-lists", action="store_true", help="Seed embeddings as lists of doubles instead of packed binary")
+    parser.add_argument("--face-image", default=DEFAULT_FACE_IMAGE, help="Frame used for the embedding benchmark")
+    parser.add_argument("--out", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    report = run(sizes, args.lbph_max_size, args.samples, args.repeat, args.face_image, args.legacy_lists)
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+        print(f"[BENCH] Results written to {args.out}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import os
+import argparse
+import asyncio
+import base64
+import glob
+import itertools
+import json
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+import numpy as np
+
+from . import memory_mongo
+
+# HTTP load test for the recognition endpoints.
+# Replays a directory of face frames at a fixed concurrency and reports throughput,
+# latency percentiles and error rates. By default it starts the backend in-process on
+# the in-memory Mongo stand-in, so it runs fully offline:
+#
+#   python -m backend.benchmarks.load_test --frames public/Students --enroll 1 \
+#       --endpoint /face/recognize --concurrency 16 --duration 30
+#
+# Use --url to target an already running server instead (no enrollment isolation).
+
+ENDPOINTS = ("/face/recognize", "/attendance/mark", "/students/add")
+
+def load_frames(frames_dir):
+    valid_extensions = {".jpg", ".jpeg", ".png"}
+    paths = sorted(
+        p for p in glob.glob(os.path.join(frames_dir, "**", "*.*"), recursive=True)
+        if os.path.splitext(p)[1].lower() in valid_extensions
+    )
+    frames = []
+    for p in paths:
+        mime = "image/png" if p.lower().endswith(".png") else "image/jpeg"
+        with open(p, "rb") as f:
+            frames.append(f"data:{mime};base64," + base64.b64encode(f.read()).decode())
+    return frames
+
+# ==== MINIMAL ASYNC HTTP/1.1 CLIENT (keep-alive, stdlib only) ====
+
+class Connection:
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def post_json(self, path, payload):
+        if self.writer is None:
+            await self._connect()
+        body = json.dumps(payload).encode()
+        head = (
+            f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n"
+            f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        ).encode()
+        try:
+            self.writer.write(head + body)
+            await self.writer.drain()
+            return await self._read_response()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            raise
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Server closed connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""): break
+            key, _, value = line.decode().partition(":")
+            headers[key.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            body = b""
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0: break
+                body += chunk[:-2]
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, headers, body
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+# ==== LOAD GENERATOR ====
+
+def make_payload(endpoint, frame, seq, run_id):
+    if endpoint == "/students/add":
+        return {
+            "name": f"Load Test {seq}",
+            "rollNo": f"LOAD-{run_id}-{seq:06d}",
+            "department": "LOAD",
+            "email": f"load{run_id}{seq}@example.com",
+            "phone": "0000000000",
+            "images": [frame],
+        }
+    return {"image": frame}
+
+async def run_load(host, port, endpoint, frames, concurrency, total_requests, duration):
+    latencies = []
+    statuses = Counter()
+    errors = Counter()
+    counter = itertools.count()
+    run_id = str(int(time.time()))
+    deadline = time.perf_counter() + duration if duration else None
+
+    async def worker():
+        conn = Connection(host, port)
+        while True:
+            seq = next(counter)
+            if total_requests and seq >= total_requests: break
+            if deadline and time.perf_counter() >= deadline: break
+            payload = make_payload(endpoint, frames[seq % len(frames)], seq, run_id)
+            start = time.perf_counter()
+            try:
+                status, _, _ = await conn.post_json(endpoint, payload)
+                statuses[status] += 1
+            except Exception as e:
+                errors[type(e).__name__] += 1
+                continue
+            finally:
+                latencies.append((time.perf_counter() - start) * 1000)
+        await conn.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    completed = sum(statuses.values())
+    failed = sum(n for s, n in statuses.items() if s >= 400) + sum(errors.values())
+    lat = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": completed + sum(errors.values()),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "latency_ms": {
+            "mean": round(float(lat.mean()), 2),
+            "p50": round(float(np.percentile(lat, 50)), 2),
+            "p95": round(float(np.percentile(lat, 95)), 2),
+            "p99": round(float(np.percentile(lat, 99)), 2),
+            "max": round(float(lat.max()), 2),
+        },
+        "status_codes": {str(k): v for k, v in sorted(statuses.items())},
+        "transport_errors": dict(errors),
+        "error_rate": round(failed / max(1, len(latencies)), 4),
+    }
+
+# ==== LOCAL SERVER ====
+
+def start_local_server(app_path, port, workdir):
+    """
+    Imports the app on the in-memory Mongo stand-in, redirects its on-disk folders to
+    workdir and serves it with uvicorn on a background thread.
+    """
+    import importlib
+    import uvicorn
+
+    memory_mongo.install()
+    app_module = importlib.import_module(app_path)
+    for attr, sub in (("UPLOAD_DIR", "uploads"), ("STUDENT_IMAGES_DIR", "Student_Images"), ("MODEL_DIR", "trained_model")):
+        if hasattr(app_module, attr):
+            setattr(app_module, attr, os.path.join(workdir, sub))
+            os.makedirs(getattr(app_module, attr), exist_ok=True)
+    if hasattr(app_module, "THUMBNAIL_DIR"):
+        app_module.THUMBNAIL_DIR = os.path.join(app_module.UPLOAD_DIR, "thumbs")
+    if hasattr(app_module, "MODEL_DIR"):
+        app_module.MODEL_PATH = os.path.join(app_module.MODEL_DIR, "lbph_model.yml")
+        app_module.LABEL_MAP_PATH = os.path.join(app_module.MODEL_DIR, "label_map.json")
+        app_module.ROI_CACHE_DIR = os.path.join(app_module.MODEL_DIR, "roi_cache")
+    # Enrollment samples are written by face_embedding itself, not by the app module
+    face_embedding = importlib.import_module(".face_embedding", app_module.__package__)
+    face_embedding.SAMPLES_DIR = os.path.join(workdir, "enrollment_samples")
+
+    config = uvicorn.Config(app_module.app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+def wait_until_ready(base_url, timeout=60):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/ready", timeout=2).status_code == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    print("[WARNING] Backend did not report ready before timeout", file=sys.stderr)
+
+def enroll(base_url, frames, count):
+    import requests
+    for i, frame in enumerate(frames[:count]):
+        r = requests.post(f"{base_url}/students/add", json=make_payload("/students/add", frame, i, "seed"), timeout=120)
+        if r.status_code != 200:
+            print(f"[WARNING] Enrollment {i} failed: {r.status_code} {r.text[:200]}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the recognition endpoints")
+    parser.add_argument("--frames", required=True, help="Directory of face images to replay")
+    parser.add_argument("--endpoint", choices=ENDPOINTS, default="/face/recognize")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=0, help="Total requests (0 = use --duration)")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds to run when --requests is 0")
+    parser.add_argument("--app", default="backend.app", help="App module to start locally (backend.app or backend.app_team)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Target an already running server instead of starting one")
+    parser.add_argument("--enroll", type=int, default=0, help="Enroll the first N frames as students before the run")
+    parser.add_argument("--out", help="Also write the JSON report here")
+    args = parser.parse_args()
+
+    frames = load_frames(args.frames)
+    if not frames:
+        parser.error(f"No images found in {args.frames}")
+
+    if args.url:
+        base_url = args.url.rstrip("/")
+    else:
+        start_local_server(args.app, args.port, tempfile.mkdtemp(prefix="loadtest_"))
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    # Enroll only once the startup gallery load / training has finished, so it cannot race it
+    wait_until_ready(base_url)
+    if args.enroll:
+        enroll(base_url, frames, args.enroll)
+
+    parsed = urlparse(base_url)
+    report = asyncio.run(run_load(
+        parsed.hostname, parsed.port or 80, args.endpoint, frames,
+        args.concurrency, args.requests, None if args.requests else args.duration
+    ))
+    report["target"] = base_url if args.url else args.app
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import copy
+import re
+import threading
+
+from bson import ObjectId
+
+# In-memory stand-in for the pymongo and Motor collections in backend/database.py.
+# Supports the subset of queries the backend issues, so benchmarks and load tests
+# can import backend.app / backend.app_team and run with no MongoDB server.
+#
+#   from backend.benchmarks import memory_mongo
+#   memory_mongo.install()      # must run before importing backend.app
+#   from backend import app
+
+def _get(doc, path):
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+_MISSING = object()
+
+def _set(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+def _unset(doc, path):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+def _compare(value, op, arg):
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$in":
+        return (None if value is _MISSING else value) in arg
+    if op == "$nin":
+        return value is _MISSING or value not in arg
+    if op == "$ne":
+        return value != arg
+    if op == "$regex":
+        return isinstance(value, str) and re.search(arg, value) is not None
+    if value is _MISSING or value is None:
+        return False
+    if op == "$gt": return value > arg
+    if op == "$gte": return value >= arg
+    if op == "$lt": return value < arg
+    if op == "$lte": return value <= arg
+    raise NotImplementedError(f"Operator {op} not supported by memory_mongo")
+
+def matches(doc, query):
+    for key, cond in (query or {}).items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond): return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in cond): return False
+        elif key == "$nor":
+            if any(matches(doc, q) for q in cond): return False
+        elif isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+            value = _get(doc, key)
+            ops = dict(cond)
+            options = ops.pop("$options", "")
+            for op, arg in ops.items():
+                if op == "$regex" and "i" in options:
+                    arg = f"(?i){arg}"
+                if not _compare(value, op, arg): return False
+        else:
+            value = _get(doc, key)
+            if isinstance(value, list) and not isinstance(cond, list):
+                if cond not in value: return False
+            elif value is _MISSING:
+                if cond is not None: return False
+            elif value != cond:
+                return False
+    return True
+
+def _sort_key(value):
+    # Missing and null sort first, as in MongoDB
+    return (value is not _MISSING and value is not None, None if value is _MISSING else value)
+
+def _project(doc, projection):
+    # Shallow copies: nested values are shared, which is fine for read-only callers
+    # and keeps 100k-document galleries cheap to scan.
+    if not projection:
+        return dict(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: doc[k] for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    return {k: v for k, v in doc.items() if k not in projection}
+
+class _Result:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+class MemoryCursor:
+    def __init__(self, docs, projection=None):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key_or_list, direction=1):
+        keys = key_or_list if isinstance(key_or_list, list) else [(key_or_list, direction)]
+        for key, d in reversed(keys):
+            self._docs.sort(key=lambda doc: _sort_key(_get(doc, key)), reverse=d < 0)
+        return self
+
+    def skip(self, n):
+        self._skip = n
+        return self
+
+    def limit(self, n):
+        self._limit = n
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        docs = self._docs[self._skip:]
+        if self._limit:
+            docs = docs[:self._limit]
+        for doc in docs:
+            yield _project(doc, self._projection)
+
+    def to_list(self):
+        return list(self)
+
+class MemoryCollection:
+    def __init__(self, name):
+        self.name = name
+        self.docs = []
+        self.indexes = {"_id_": {"key": [("_id", 1)]}}
+        self.lock = threading.Lock()
+
+    # ---- reads ----
+    def find(self, query=None, projection=None, **kwargs):
+        with self.lock:
+            docs = [d for d in self.docs if matches(d, query)]
+        return MemoryCursor(docs, projection)
+
+    def find_one(self, query=None, projection=None, **kwargs):
+        for doc in self.find(query, projection).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, query=None, **kwargs):
+        with self.lock:
+            return sum(1 for d in self.docs if matches(d, query))
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def distinct(self, key, query=None):
+        values = []
+        with self.lock:
+            for d in self.docs:
+                if not matches(d, query): continue
+                v = _get(d, key)
+                if v is not _MISSING and v not in values:
+                    values.append(v)
+        return values
+
+    # ---- writes ----
+    def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        with self.lock:
+            self.docs.append(dict(doc))
+        return _Result(inserted_id=doc["_id"], acknowledged=True)
+
+    def insert_many(self, docs, ordered=True):
+        ids = [self.insert_one(d).inserted_id for d in docs]
+        return _Result(inserted_ids=ids, acknowledged=True)
+
+    def _apply_update(self, doc, update):
+        for op, fields in update.items():
+            for key, value in fields.items():
+                if op == "$set":
+                    _set(doc, key, copy.deepcopy(value))
+                elif op == "$setOnInsert":
+                    pass
+                elif op == "$inc":
+                    doc[key] = doc.get(key, 0) + value
+                elif op == "$unset":
+                    _unset(doc, key)
+                elif op == "$push":
+                    doc.setdefault(key, []).append(copy.deepcopy(value))
+                elif op == "$addToSet":
+                    values = doc.setdefault(key, [])
+                    if value not in values:
+                        values.append(copy.deepcopy(value))
+                else:
+                    raise NotImplementedError(f"Update operator {op} not supported by memory_mongo")
+
+    def update_one(self, query, update, upsert=False):
+        with self.lock:
+            for doc in self.docs:
+                if matches(doc, query):
+                    before = copy.deepcopy(doc)
+                    self._apply_update(doc, update)
+                    return _Result(matched_count=1, modified_count=int(before != doc), upserted_id=None)
+            if not upsert:
+                return _Result(matched_count=0, modified_count=0, upserted_id=None)
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            doc["_id"] = doc.get("_id", ObjectId())
+            self._apply_update(doc, update)
+            for key, value in update.get("$setOnInsert", {}).items():
+                doc[key] = copy.deepcopy(value)
+            self.docs.append(doc)
+            return _Result(matched_count=0, modified_count=0, upserted_id=doc["_id"])
+
+    def bulk_write(self, requests, ordered=True):
+        modified = 0
+        for req in requests:
+            # Only UpdateOne is used by the backend; pymongo keeps its arguments in private attributes
+            modified += self.update_one(req._filter, req._doc, upsert=bool(req._upsert)).modified_count
+        return _Result(modified_count=modified, acknowledged=True)
+
+    def update_many(self, query, update, upsert=False):
+        modified = 0
+        with self.lock:
+            for doc in self.docs:
+                if matches(doc, query):
+                    self._apply_update(doc, update)
+                    modified += 1
+        return _Result(matched_count=modified, modified_count=modified, upserted_id=None)
+
+    def delete_one(self, query):
+        with self.lock:
+            for i, doc in enumerate(self.docs):
+                if matches(doc, query):
+                    del self.docs[i]
+                    return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+    def delete_many(self, query):
+        with self.lock:
+            keep = [d for d in self.docs if not matches(d, query)]
+            deleted = len(self.docs) - len(keep)
+            self.docs = keep
+        return _Result(deleted_count=deleted)
+
+    # ---- indexes ----
+    def create_index(self, keys, **kwargs):
+        keys = keys if isinstance(keys, list) else [(keys, 1)]
+        name = kwargs.get("name") or "_".join(f"{k}_{d}" for k, d in keys)
+        self.indexes[name] = {"key": keys}
+        return name
+
+    def index_information(self):
+        return dict(self.indexes)
+
+    def drop_index(self, name):
+        self.indexes.pop(name, None)
+
+# ---- async (Motor-style) adapters used by the request handlers ----
+
+class AsyncMemoryCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, key_or_list, direction=1):
+        self._cursor.sort(key_or_list, direction)
+        return self
+
+    def skip(self, n):
+        self._cursor.skip(n)
+        return self
+
+    def limit(self, n):
+        self._cursor.limit(n)
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    async def to_list(self, length=None):
+        docs = list(self._cursor)
+        return docs[:length] if length else docs
+
+    async def __aiter__(self):
+        for doc in self._cursor:
+            yield doc
+
+class AsyncMemoryCollection:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncMemoryCursor(self.collection.find(*args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(self.collection, name)
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+class MemoryDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name):
+        if name not in self.collections:
+            self.collections[name] = MemoryCollection(name)
+        return self.collections[name]
+
+def install():
+    """
+    Points backend.database (and any already imported app module) at fresh in-memory collections.
+    Returns the MemoryDatabase.
+    """
+    import sys
+    from backend import database
+
+    db = MemoryDatabase()
+    database.db = db
+    database.students_collection = db["students"]
+    database.attendance_collection = db["attendance"]
+    database.admin_collection = db["admins"]
+    database.rollup_collection = db["attendance_daily"]
+    database.async_students = database.AsyncCollection(AsyncMemoryCollection(db["students"]), database.STUDENT_PROJECTION)
+    database.async_attendance = database.AsyncCollection(AsyncMemoryCollection(db["attendance"]))
+    database.async_admins = database.AsyncCollection(AsyncMemoryCollection(db["admins"]))
+    database.async_rollups = database.AsyncCollection(AsyncMemoryCollection(db["attendance_daily"]))
+
+    for mod_name in ("backend.app", "backend.app_team"):
+        mod = sys.modules.get(mod_name)
+        if mod is None: continue
+        for attr in ("students_collection", "attendance_collection", "admin_collection", "rollup_collection",
+                     "async_students", "async_attendance", "async_admins", "async_rollups"):
+            if hasattr(mod, attr):
+                setattr(mod, attr, getattr(database, attr))
+    return db
@@ -0,0 +1,88 @@
+import os
+import argparse
+import glob
+import json
+import time
+
+import cv2
+import numpy as np
+
+# Replays slow-request captures (see backend/request_timing.py) offline against
+# app.get_face_embedding and app.find_best_match, next to the timings recorded live.
+#
+#   python -m backend.benchmarks.replay_captures backend/slow_captures
+#   python -m backend.benchmarks.replay_captures backend/slow_captures --no-gallery
+#
+# The gallery is loaded from MONGO_URI unless --no-gallery is given, in which case
+# only decode, detection and embedding are replayed.
+
+def _ms(start):
+    return (time.perf_counter() - start) * 1000
+
+def replay_one(app_module, frame_bytes, repeat, with_match):
+    timings = {"image_decode": [], "embedding_total": [], "gallery_match": []}
+    outcome = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        img = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+        timings["image_decode"].append(_ms(start))
+        if img is None:
+            return {"error": "undecodable frame"}
+
+        start = time.perf_counter()
+        emb = app_module.get_face_embedding(img, silent=True)
+        timings["embedding_total"].append(_ms(start))
+        if emb is None:
+            outcome = {"result": "no_face"}
+            continue
+
+        if with_match:
+            start = time.perf_counter()
+            person, score = app_module.find_best_match(emb)
+            timings["gallery_match"].append(_ms(start))
+            outcome = {"result": "match" if person and score > app_module.SIMILARITY_THRESHOLD else "reject",
+                       "best_id": person.get("id") if person else None, "score": round(float(score), 4)}
+        else:
+            outcome = {"result": "embedded"}
+
+    replayed = {k: round(float(np.median(v)), 3) for k, v in timings.items() if v}
+    return {"replayed_ms": replayed, **(outcome or {})}
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay slow-request captures offline")
+    parser.add_argument("capture_dir", nargs="?", default="backend/slow_captures")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per capture (median is reported)")
+    parser.add_argument("--no-gallery", action="store_true", help="Skip loading the gallery and matching")
+    parser.add_argument("--out", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    captures = sorted(glob.glob(os.path.join(args.capture_dir, "*.json")))
+    if not captures:
+        parser.error(f"No captures found in {args.capture_dir}")
+
+    from backend import app as app_module
+    if not args.no_gallery:
+        app_module.load_known_faces()
+
+    report = []
+    for meta_path in captures:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        frame_path = meta_path[:-5] + ".jpg"
+        if not os.path.exists(frame_path):
+            continue
+        with open(frame_path, "rb") as f:
+            frame_bytes = f.read()
+
+        result = replay_one(app_module, frame_bytes, args.repeat, not args.no_gallery)
+        entry = {"id": meta["id"], "path": meta.get("path"), "live_total_ms": meta.get("total_ms"),
+                 "live_stages_ms": meta.get("stages_ms", {}), **result}
+        report.append(entry)
+        print(f"{entry['id']}  live {entry['live_total_ms']:>8.1f} ms  replay {result.get('replayed_ms', {})}  {result.get('result', result.get('error'))}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import os
+import argparse
+import csv
+import multiprocessing
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+from bson import ObjectId
+
+# Bulk enrollment from a ZIP (or directory tree) of Student_Images folders plus a CSV roster.
+# Images are decoded / embedded on a process pool, students are written with insert_many,
+# and the gallery (app.py) or LBPH model (app_team.py) is refreshed once at the end.
+#
+#   roster.csv:  name,rollNo,department,email,phone[,folder]
+#   archive:     <folder or rollNo or name>/*.jpg for every row, at any depth
+#
+#   POST /students/bulk          multipart: roster=<csv>, archive=<zip>  -> 202 {"id": ...}
+#   GET  /students/bulk/{id}     progress and per-row errors
+#
+# Or from a shell, against a running server:
+#   python -m backend.bulk_enroll roster.csv Student_Images/ --url http://127.0.0.1:8001
+
+REQUIRED_COLUMNS = ("name", "rollNo", "department", "email")
+VALID_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+BULK_WORKERS = int(os.getenv("BULK_WORKERS", "0")) or None # None = one per CPU
+INSERT_BATCH = 500
+MAX_JOBS = 20 # Finished jobs kept for status queries
+
+# ==== ROSTER ====
+
+def read_roster(roster_path):
+    """
+    Returns (rows, errors). Each row carries its CSV line number as "row".
+    Raises ValueError if the file is not a CSV with the required columns.
+    """
+    with open(roster_path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        columns = [c.strip() for c in (reader.fieldnames or [])]
+        missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+        if missing:
+            raise ValueError(f"Roster is missing column(s): {', '.join(missing)}")
+        reader.fieldnames = columns
+
+        rows, errors = [], []
+        seen_rolls, seen_emails = set(), set()
+        for record in reader:
+            row = {k: (v or "").strip() for k, v in record.items() if k}
+            row["row"] = reader.line_num
+            empty = [c for c in REQUIRED_COLUMNS if not row.get(c)]
+            if empty:
+                errors.append(_row_error(row, f"Missing {', '.join(empty)}"))
+            elif row["rollNo"] in seen_rolls:
+                errors.append(_row_error(row, "Duplicate rollNo in roster"))
+            elif row["email"] in seen_emails:
+                errors.append(_row_error(row, "Duplicate email in roster"))
+            else:
+                seen_rolls.add(row["rollNo"])
+                seen_emails.add(row["email"])
+                rows.append(row)
+    return rows, errors
+
+def _row_error(row, error):
+    return {"row": row.get("row"), "rollNo": row.get("rollNo", ""), "error": error}
+
+def index_folders(source_dir):
+    """
+    { folder name: sorted image paths } for every directory holding images, at any depth.
+    """
+    folders = {}
+    for dirpath, dirnames, filenames in os.walk(source_dir):
+        dirnames.sort()
+        images = sorted(
+            os.path.join(dirpath, f) for f in filenames
+            if os.path.splitext(f)[1].lower() in VALID_EXTENSIONS and not f.startswith(".")
+        )
+        if images:
+            folders.setdefault(os.path.basename(dirpath), images)
+    return folders
+
+def _find_images(row, folders):
+    for key in (row.get("folder"), row["rollNo"], row["name"]):
+        if key and key in folders:
+            return folders[key]
+    return None
+
+# ==== WORKER (runs in the process pool) ====
+
+def _init_worker():
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+def _write_profile(image_bytes, ext, roll_no, upload_dir, thumbnail_dir):
+    from .thumbnails import make_thumbnails
+
+    os.makedirs(upload_dir, exist_ok=True)
+    filename = f"{roll_no}_profile{'.png' if ext == '.png' else '.jpg'}"
+    with open(os.path.join(upload_dir, filename), "wb") as f:
+        f.write(image_bytes)
+    return f"/uploads/{filename}", make_thumbnails(image_bytes, roll_no, thumbnail_dir)
+
+def prepare_student(task):
+    """
+    Turns one roster row's images into the file outputs and document fields of an enrollment.
+    mode "embeddings" (app.py) stores face histograms; mode "images" (app_team.py) copies the
+    samples into Student_Images/<rollNo> for LBPH training. Nothing is written for a failed row.
+    Returns {"rollNo", "studentId", "fields"} or {"rollNo", "error"}.
+    """
+    roll_no = task["rollNo"]
+    try:
+        samples = [] # (bytes, ext, image)
+        for path in task["paths"]:
+            with open(path, "rb") as f:
+                data = f.read()
+            img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+            if img is not None:
+                samples.append((data, os.path.splitext(path)[1].lower(), img))
+        if not samples:
+            return {"rollNo": roll_no, "error": "No readable images"}
+
+        fields = {}
+        if task["mode"] == "embeddings":
+            from .face_embedding import embed_image, pack_embedding, save_samples, EMBEDDING_VERSION
+
+            embeddings, kept = [], []
+            for data, ext, img in samples:
+                hist = embed_image(img, task["detector"], task["min_confidence"])
+                if hist is not None:
+                    embeddings.append(pack_embedding(hist))
+                    kept.append((data, ext))
+            if not embeddings:
+                return {"rollNo": roll_no, "error": "Could not detect face in any provided images"}
+            save_samples(task["studentId"], kept, task.get("samples_dir"))
+            fields["faceEmbeddings"] = embeddings
+            fields["embeddingVersion"] = EMBEDDING_VERSION
+            profile = kept[0]
+        else:
+            student_dir = os.path.join(task["student_images_dir"], roll_no)
+            shutil.rmtree(student_dir, ignore_errors=True) # Orphaned folder without a student record
+            os.makedirs(student_dir)
+            for idx, (data, ext, _) in enumerate(samples):
+                with open(os.path.join(student_dir, f"sample_{idx}{ext}"), "wb") as f:
+                    f.write(data)
+            profile = samples[0][:2]
+
+        fields["profileImage"], fields["thumbnails"] = _write_profile(*profile, roll_no, task["upload_dir"], task["thumbnail_dir"])
+        return {"rollNo": roll_no, "studentId": task["studentId"], "fields": fields}
+    except Exception as e:
+        return {"rollNo": roll_no, "error": f"Processing failed: {e}"}
+
+def discard_outputs(roll_no, student_id, profile_image, options):
+    from .thumbnails import delete_thumbnails
+    from .face_embedding import samples_dir
+
+    shutil.rmtree(samples_dir(student_id, options.get("samples_dir")), ignore_errors=True)
+    if options.get("student_images_dir"):
+        shutil.rmtree(os.path.join(options["student_images_dir"], roll_no), ignore_errors=True)
+    if profile_image:
+        try: os.remove(os.path.join(options["upload_dir"], os.path.basename(profile_image)))
+        except OSError: pass
+    delete_thumbnails(roll_no, options["thumbnail_dir"])
+
+# ==== JOBS ====
+
+class BulkJob:
+    """
+    Progress of one import. States: queued -> processing -> writing -> refreshing -> done | failed.
+    """
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:12]
+        self.lock = threading.Lock()
+        self.state = "queued"
+        self.total = 0
+        self.processed = 0
+        self.inserted = 0
+        self.errors = []
+        self.message = None
+        self.created = datetime.now().isoformat(timespec="seconds")
+        self.started = None
+        self.duration = None
+
+    def update(self, **fields):
+        with self.lock:
+            for key, value in fields.items():
+                setattr(self, key, value)
+
+    def advance(self, n=1):
+        with self.lock:
+            self.processed += n
+
+    def fail_rows(self, errors):
+        with self.lock:
+            self.errors.extend(errors)
+
+    def status(self):
+        with self.lock:
+            return {
+                "id": self.id,
+                "state": self.state,
+                "total": self.total,
+                "processed": self.processed,
+                "inserted": self.inserted,
+                "failed": len(self.errors),
+                "errors": sorted(self.errors, key=lambda e: e["row"] or 0),
+                "message": self.message,
+                "created": self.created,
+                "duration_seconds": self.duration,
+            }
+
+_jobs = OrderedDict() # { id: BulkJob }, oldest first
+_jobs_lock = threading.Lock()
+
+def get_job(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+def _register(job):
+    with _jobs_lock:
+        if any(j.state not in ("done", "failed") for j in _jobs.values()):
+            raise RuntimeError("Another bulk import is still running")
+        _jobs[job.id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+
+def run_import(job, roster_path, source_dir, options, on_complete=None, workers=BULK_WORKERS):
+    """
+    Runs one import to completion, recording progress and per-row errors on `job`.
+    `options` holds mode, detector, min_confidence, upload_dir, thumbnail_dir and
+    student_images_dir; on_complete() runs once if any student was inserted.
+    """
+    from pymongo.errors import BulkWriteError
+    from .database import students_collection
+
+    start = time.perf_counter()
+    job.update(state="processing", started=datetime.now().isoformat(timespec="seconds"))
+    try:
+        rows, errors = read_roster(roster_path)
+        job.update(total=len(rows) + len(errors))
+        job.fail_rows(errors)
+        job.advance(len(errors))
+
+        # One query for every rollNo / email already enrolled
+        taken_rolls, taken_emails = set(), set()
+        query = {"$or": [{"rollNo": {"$in": [r["rollNo"] for r in rows]}}, {"email": {"$in": [r["email"] for r in rows]}}]}
+        for s in students_collection.find(query, {"rollNo": 1, "email": 1}) if rows else []:
+            taken_rolls.add(s.get("rollNo"))
+            taken_emails.add(s.get("email"))
+
+        folders = index_folders(source_dir)
+        tasks, by_roll, rejected = [], {}, []
+        for row in rows:
+            paths = _find_images(row, folders)
+            if row["rollNo"] in taken_rolls:
+                rejected.append(_row_error(row, "Student already exists"))
+            elif row["email"] in taken_emails:
+                rejected.append(_row_error(row, "Email already registered"))
+            elif not paths:
+                rejected.append(_row_error(row, f"No image folder named {row.get('folder') or row['rollNo']}"))
+            else:
+                tasks.append({**options, "rollNo": row["rollNo"], "studentId": str(ObjectId()), "paths": paths})
+                by_roll[row["rollNo"]] = row
+        job.fail_rows(rejected)
+        job.advance(len(rejected))
+
+        prepared = []
+        def collect(result):
+            row = by_roll[result["rollNo"]]
+            if "error" in result:
+                job.fail_rows([_row_error(row, result["error"])])
+            else:
+                prepared.append((row, result["studentId"], result["fields"]))
+            job.advance()
+
+        if len(tasks) > 1 and workers != 1:
+            # Spawned (not forked) workers: imports run on a background thread of a threaded server
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+                for result in pool.map(prepare_student, tasks, chunksize=2):
+                    collect(result)
+        else:
+            for task in tasks:
+                collect(prepare_student(task))
+
+        job.update(state="writing")
+        inserted = 0
+        for i in range(0, len(prepared), INSERT_BATCH):
+            batch = prepared[i:i + INSERT_BATCH]
+            docs = [{
+                "_id": ObjectId(student_id),
+                "name": row["name"],
+                "rollNo": row["rollNo"],
+                "department": row["department"],
+                "email": row["email"],
+                "phone": row.get("phone", ""),
+                "profileImage": fields["profileImage"],
+                "thumbnails": fields["thumbnails"],
+                **{k: fields[k] for k in ("faceEmbeddings", "embeddingVersion") if k in fields},
+                "createdAt": datetime.now(),
+            } for row, student_id, fields in batch]
+            try:
+                inserted += len(students_collection.insert_many(docs, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                failed = {err["index"]: err.get("errmsg", "Insert failed") for err in e.details.get("writeErrors", [])}
+                inserted += len(batch) - len(failed)
+                for index, message in failed.items():
+                    row, student_id, fields = batch[index]
+                    discard_outputs(row["rollNo"], student_id, fields["profileImage"], options)
+                    job.fail_rows([_row_error(row, message)])
+            job.update(inserted=inserted)
+
+        if inserted and on_complete:
+            job.update(state="refreshing")
+            on_complete()
+        job.update(state="done", message=f"Enrolled {inserted} of {job.total} students")
+        print(f"[INFO] Bulk import {job.id}: {inserted} enrolled, {len(job.errors)} failed")
+    except Exception as e:
+        job.update(state="failed", message=str(e))
+        print(f"[ERROR] Bulk import {job.id} failed: {e}")
+    finally:
+        job.update(duration=round(time.perf_counter() - start, 3))
+
+def start_job(roster_file, archive_file, options, on_complete=None):
+    """
+    Stores an uploaded roster and ZIP in a scratch directory and runs the import on a
+    background thread. Raises ValueError for unusable uploads, RuntimeError if busy.
+    """
+    workdir = tempfile.mkdtemp(prefix="bulk_enroll_")
+    try:
+        roster_path = os.path.join(workdir, "roster.csv")
+        with open(roster_path, "wb") as f:
+            shutil.copyfileobj(roster_file, f)
+        read_roster(roster_path) # Reject a bad header before accepting the job
+
+        if not zipfile.is_zipfile(archive_file):
+            raise ValueError("Archive must be a ZIP file")
+        source_dir = os.path.join(workdir, "images")
+        with zipfile.ZipFile(archive_file) as zf:
+            zf.extractall(source_dir) # Strips absolute paths and '..' components
+
+        job = BulkJob()
+        _register(job)
+    except Exception:
+        shutil.rmtree(workdir, ignore_errors=True)
+        raise
+
+    def run():
+        try:
+            run_import(job, roster_path, source_dir, options, on_complete)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    threading.Thread(target=run, daemon=True).start()
+    print(f"[INFO] Bulk import {job.id} started")
+    return job
+
+# ==== CLI ====
+
+def _zip_directory(source_dir):
+    tmp = tempfile.TemporaryFile()
+    with zipfile.ZipFile(tmp, "w", zipfile.ZIP_STORED) as zf: # JPEG / PNG are already compressed
+        for dirpath, _, filenames in os.walk(source_dir):
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() in VALID_EXTENSIONS:
+                    path = os.path.join(dirpath, name)
+                    zf.write(path, os.path.relpath(path, source_dir))
+    tmp.seek(0)
+    return tmp
+
+def main():
+    import requests
+
+    parser = argparse.ArgumentParser(description="Bulk student enrollment")
+    parser.add_argument("roster", help="CSV with name,rollNo,department,email[,phone][,folder]")
+    parser.add_argument("source", help="ZIP file or directory of per-student image folders")
+    parser.add_argument("--url", default="http://127.0.0.1:8001", help="Backend base URL")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between progress polls")
+    args = parser.parse_args()
+
+    archive = _zip_directory(args.source) if os.path.isdir(args.source) else open(args.source, "rb")
+    with archive, open(args.roster, "rb") as roster:
+        res = requests.post(f"{args.url}/students/bulk", files={
+            "roster": ("roster.csv", roster, "text/csv"),
+            "archive": ("students.zip", archive, "application/zip"),
+        })
+    if res.status_code != 202:
+        parser.exit(1, f"[ERROR] {res.status_code}: {res.text}\n")
+
+    job_id = res.json()["id"]
+    while True:
+        status = requests.get(f"{args.url}/students/bulk/{job_id}").json()
+        print(f"[INFO] {status['state']}: {status['processed']}/{status['total']} processed, {status['inserted']} inserted, {status['failed']} failed")
+        if status["state"] in ("done", "failed"):
+            break
+        time.sleep(args.interval)
+
+    for err in status["errors"]:
+        print(f"[WARNING] Row {err['row']} ({err['rollNo']}): {err['error']}")
+    if status["message"]:
+        print(f"[INFO] {status['message']}")
+    if status["state"] == "failed":
+        parser.exit(1)
+
+if __name__ == "__main__":
+    main()
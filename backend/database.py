@@ -1,4 +1,5 @@
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 import os
 from dotenv import load_dotenv
 
@@ -7,9 +8,56 @@ load_dotenv()
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017/vidya-rakshak")
 DB_NAME = "vidya-rakshak"
 
-client = MongoClient(MONGO_URI)
+# Pool sizing and timeouts shared by both clients. A slow or unreachable server fails a
+# request after a few seconds instead of holding a handler (and its pool slot) indefinitely.
+CLIENT_OPTIONS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "2")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+    "waitQueueTimeoutMS": int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000")),
+    "socketTimeoutMS": int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "10000")),
+}
+
+# Face embeddings are only needed by the gallery loaders; every other read skips them.
+STUDENT_PROJECTION = {"faceEmbedding": 0, "faceEmbeddings": 0, "faceEmbeddingsByVersion": 0}
+
+# ==== SYNC CLIENT (background threads, training, CLI tools) ====
+
+# connect=False: no server monitoring threads until the first operation, so imports stay cheap
+client = MongoClient(MONGO_URI, connect=False, **CLIENT_OPTIONS)
 db = client[DB_NAME]
 
 students_collection = db["students"]
 attendance_collection = db["attendance"]
 admin_collection = db["admins"]
+rollup_collection = db["attendance_daily"] # One doc per (date, department), see attendance_rollups.py
+
+# ==== ASYNC CLIENT (request handlers) ====
+
+class AsyncCollection:
+    """
+    Wraps a Motor collection so find/find_one apply a default projection.
+    Pass projection=... explicitly to override it; everything else is delegated.
+    """
+    def __init__(self, collection, default_projection=None):
+        self.collection = collection
+        self.default_projection = default_projection
+
+    def find(self, filter=None, projection=None, **kwargs):
+        return self.collection.find(filter, projection or self.default_projection, **kwargs)
+
+    async def find_one(self, filter=None, projection=None, **kwargs):
+        return await self.collection.find_one(filter, projection or self.default_projection, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+async_client = AsyncIOMotorClient(MONGO_URI, **CLIENT_OPTIONS)
+async_db = async_client[DB_NAME]
+
+async_students = AsyncCollection(async_db["students"], STUDENT_PROJECTION)
+async_attendance = AsyncCollection(async_db["attendance"])
+async_admins = AsyncCollection(async_db["admins"])
+async_rollups = AsyncCollection(async_db["attendance_daily"])
@@ -0,0 +1,212 @@
+import os
+import argparse
+import glob
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+
+from .face_embedding import (EMBEDDING_VERSION, VERSIONED_FIELD, has_current_query, staged_key, samples_dir,
+                             embed_image, pack_embedding, unpack_embedding)
+
+# Re-embeds students whose faceEmbeddings came from an older recipe (see backend/face_embedding.py).
+# Embeddings are recomputed from the stored enrollment samples (or the profile image for students
+# enrolled before samples were kept) on a process pool, in batches ordered by _id.
+# After each batch the last _id is checkpointed, so an interrupted run resumes where it stopped:
+#
+#   python -m backend.embedding_backfill [--batch 200] [--workers 4] [--url http://127.0.0.1:8001]
+#
+# New vectors are staged in faceEmbeddingsByVersion next to the old faceEmbeddings, so servers
+# on either version keep recognizing every student during the run. Once every batch is done they
+# are promoted into faceEmbeddings and the old vectors dropped; pass --keep-old while servers on
+# the previous version are still running, and promote later with --promote.
+# --url asks the server to reload its gallery when the run finishes.
+# Current-version embeddings still stored as lists of doubles are converted to packed binary with:
+#   python -m backend.embedding_backfill --repack
+
+CHECKPOINT_PATH = os.getenv("EMBEDDING_BACKFILL_CHECKPOINT", "backend/embedding_backfill.json")
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "mediapipe_short")
+VALID_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+def _init_worker():
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+def _reembed(task):
+    """
+    Returns (student_id, [packed embeddings]) for one student's stored images.
+    """
+    embeddings = []
+    for path in task["paths"]:
+        img = cv2.imread(path)
+        if img is None: continue
+        hist = embed_image(img, task["detector"], 0.4)
+        if hist is not None:
+            embeddings.append(pack_embedding(hist))
+    return task["id"], embeddings
+
+def source_images(student, upload_dir, base_dir=None):
+    folder = samples_dir(student["_id"], base_dir)
+    paths = sorted(p for p in glob.glob(os.path.join(folder, "*.*")) if os.path.splitext(p)[1].lower() in VALID_EXTENSIONS)
+    if not paths and student.get("profileImage"):
+        profile = os.path.join(upload_dir, os.path.basename(student["profileImage"]))
+        if os.path.exists(profile):
+            paths = [profile]
+    return paths
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    # Only an unfinished run towards the current version is resumed
+    if checkpoint.get("version") != EMBEDDING_VERSION or checkpoint.get("finished"):
+        return None
+    return checkpoint
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+def backfill(batch_size=200, workers=None, upload_dir="public/uploads", base_dir=None,
+             checkpoint_path=CHECKPOINT_PATH, restart=False, detector=FACE_DETECTOR, promote_when_done=True):
+    """
+    Stages current-version embeddings for every outdated student, then (unless
+    promote_when_done is False) promotes them. Returns the final checkpoint dict.
+    """
+    from bson import ObjectId
+    from pymongo import UpdateOne
+    from .database import students_collection
+
+    checkpoint = None if restart else load_checkpoint(checkpoint_path)
+    if checkpoint:
+        print(f"[INFO] Resuming after {checkpoint['last_id']} ({checkpoint['updated']} updated so far)")
+    else:
+        checkpoint = {"version": EMBEDDING_VERSION, "last_id": None, "updated": 0, "skipped": [], "started": datetime.now().isoformat(timespec="seconds")}
+
+    outdated = {"$or": [{"faceEmbedding": {"$exists": True}}, {"faceEmbeddings": {"$exists": True}}],
+                "$nor": [has_current_query()]}
+    print(f"[INFO] {students_collection.count_documents(outdated)} students need version {EMBEDDING_VERSION} embeddings")
+
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+        while True:
+            query = dict(outdated)
+            if checkpoint["last_id"]:
+                query["_id"] = {"$gt": ObjectId(checkpoint["last_id"])}
+            batch = list(students_collection.find(query, {"rollNo": 1, "profileImage": 1}).sort("_id", 1).limit(batch_size))
+            if not batch:
+                break
+
+            start = time.perf_counter()
+            tasks = [{"id": str(s["_id"]), "paths": source_images(s, upload_dir, base_dir), "detector": detector} for s in batch]
+            roll_nos = {str(s["_id"]): s.get("rollNo") for s in batch}
+            updates = []
+            for student_id, embeddings in pool.map(_reembed, tasks, chunksize=4):
+                if not embeddings:
+                    checkpoint["skipped"].append({"id": student_id, "rollNo": roll_nos[student_id]})
+                    continue
+                # Staged next to the old vectors; guarded on the version, so a re-enrollment during
+                # the run is never overwritten
+                updates.append(UpdateOne(
+                    {"_id": ObjectId(student_id), "$nor": [has_current_query()]},
+                    {"$set": {staged_key(): embeddings}},
+                ))
+            if updates:
+                checkpoint["updated"] += students_collection.bulk_write(updates, ordered=False).modified_count
+
+            checkpoint["last_id"] = str(batch[-1]["_id"])
+            save_checkpoint(checkpoint_path, checkpoint)
+            print(f"[INFO] Batch of {len(batch)} in {time.perf_counter() - start:.2f}s: "
+                  f"{checkpoint['updated']} updated, {len(checkpoint['skipped'])} without usable images")
+
+    checkpoint["finished"] = datetime.now().isoformat(timespec="seconds")
+    save_checkpoint(checkpoint_path, checkpoint)
+    for s in checkpoint["skipped"]:
+        print(f"[WARNING] No usable stored images for {s['rollNo']} ({s['id']}); re-enroll this student")
+    if promote_when_done:
+        promote(batch_size)
+    return checkpoint
+
+def promote(batch_size=500):
+    """
+    Moves staged current-version embeddings into faceEmbeddings and drops the old ones.
+    Servers still on the previous version stop recognizing promoted students. Safe to re-run.
+    """
+    from pymongo import UpdateOne
+    from .database import students_collection
+
+    staged = {staged_key(): {"$exists": True}}
+    updates, promoted = [], 0
+    for s in students_collection.find(staged, {VERSIONED_FIELD: 1}).sort("_id", 1).batch_size(batch_size):
+        updates.append(UpdateOne(
+            {"_id": s["_id"], **staged},
+            {"$set": {"faceEmbeddings": s[VERSIONED_FIELD][str(EMBEDDING_VERSION)], "embeddingVersion": EMBEDDING_VERSION},
+             "$unset": {"faceEmbedding": "", VERSIONED_FIELD: ""}},
+        ))
+        if len(updates) >= batch_size:
+            promoted += students_collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        promoted += students_collection.bulk_write(updates, ordered=False).modified_count
+    print(f"[INFO] Promoted version {EMBEDDING_VERSION} embeddings of {promoted} students.")
+    return promoted
+
+def repack(batch_size=500):
+    """
+    Rewrites list-of-doubles embeddings as packed binary, values unchanged. Safe to re-run.
+    """
+    from pymongo import UpdateOne
+    from .database import students_collection
+
+    query = {"$or": [{"faceEmbedding": {"$exists": True}}, {"faceEmbeddings": {"$exists": True}}]}
+    updates, repacked = [], 0
+    for s in students_collection.find(query, {"faceEmbedding": 1, "faceEmbeddings": 1}).sort("_id", 1).batch_size(batch_size):
+        embeddings = s.get("faceEmbeddings") or ([s["faceEmbedding"]] if s.get("faceEmbedding") else [])
+        if not any(isinstance(e, list) for e in embeddings) and "faceEmbedding" not in s:
+            continue
+        packed = [e if isinstance(e, bytes) else pack_embedding(unpack_embedding(e)) for e in embeddings]
+        updates.append(UpdateOne({"_id": s["_id"]}, {"$set": {"faceEmbeddings": packed}, "$unset": {"faceEmbedding": ""}}))
+        if len(updates) >= batch_size:
+            repacked += students_collection.bulk_write(updates, ordered=False).modified_count
+            updates = []
+    if updates:
+        repacked += students_collection.bulk_write(updates, ordered=False).modified_count
+    print(f"[INFO] Repacked embeddings of {repacked} students.")
+    return repacked
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute outdated face embeddings")
+    parser.add_argument("--batch", type=int, default=200, help="Students per checkpointed batch")
+    parser.add_argument("--workers", type=int, default=0, help="Pool processes (default: one per CPU)")
+    parser.add_argument("--upload-dir", default="public/uploads")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint")
+    parser.add_argument("--repack", action="store_true", help="Only convert list embeddings to packed binary")
+    parser.add_argument("--keep-old", action="store_true", help="Leave new embeddings staged next to the old ones")
+    parser.add_argument("--promote", action="store_true", help="Only promote staged embeddings (after --keep-old)")
+    parser.add_argument("--url", help="Backend base URL; reloads its gallery when done")
+    args = parser.parse_args()
+
+    if args.repack:
+        repack(args.batch)
+    elif args.promote:
+        promote(args.batch)
+    else:
+        checkpoint = backfill(args.batch, args.workers or None, args.upload_dir,
+                              checkpoint_path=args.checkpoint, restart=args.restart, promote_when_done=not args.keep_old)
+        print(f"[INFO] Backfill to version {EMBEDDING_VERSION} done: {checkpoint['updated']} updated, {len(checkpoint['skipped'])} skipped")
+
+    if args.url:
+        import requests
+        res = requests.post(f"{args.url}/gallery/reload")
+        print(f"[INFO] Gallery reload: {res.status_code} {res.text}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+import os
+os.environ.setdefault('PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION', 'python')
+os.environ.setdefault('TF_ENABLE_ONEDNN_OPTS', '0')
+
+import argparse
+import glob
+import json
+import threading
+import time
+from contextlib import nullcontext
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# Shared face detection service.
+# Every backend returns the same Detection tuples (pixel boxes clipped to the image),
+# so callers can switch detectors through FACE_DETECTOR without touching crop logic.
+#
+#   mediapipe_short  MediaPipe short-range model (selfie / webcam distance)
+#   mediapipe_full   MediaPipe full-range model (faces further from the camera)
+#   haar             OpenCV Haar cascade (no extra files, lowest recall)
+#   dnn              OpenCV DNN ResNet-10 SSD on CPU (needs DNN_PROTOTXT / DNN_MODEL files)
+#
+# Compare backends on your own images with:
+#   python -m backend.face_detector bench backend/Student_Images
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+DNN_PROTOTXT = os.getenv("DNN_PROTOTXT", os.path.join(MODELS_DIR, "deploy.prototxt"))
+DNN_MODEL = os.getenv("DNN_MODEL", os.path.join(MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel"))
+
+class Detection(NamedTuple):
+    box: Tuple[int, int, int, int] # x, y, w, h in pixels, clipped to the image
+    score: float
+    landmarks: List[Tuple[int, int]] # pixel keypoints; empty if the backend has none
+
+def _clip_box(x, y, w, h, width, height):
+    x_start, y_start = max(0, int(x)), max(0, int(y))
+    x_end, y_end = min(width, int(x + w)), min(height, int(y + h))
+    if x_end <= x_start or y_end <= y_start:
+        return None
+    return (x_start, y_start, x_end - x_start, y_end - y_start)
+
+def crop(image, detection):
+    x, y, w, h = detection.box
+    return image[y:y+h, x:x+w]
+
+# ==== BACKENDS ====
+
+class MediaPipeDetector:
+    default_confidence = 0.5
+
+    def __init__(self, model_selection, min_confidence=None):
+        import mediapipe as mp
+        self.model = mp.solutions.face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_confidence if min_confidence is not None else self.default_confidence
+        )
+        self.lock = threading.Lock() # MediaPipe graphs are not re-entrant
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        with self.lock:
+            results = self.model.process(rgb_image)
+
+        detections = []
+        for det in (results.detections or []):
+            bbox = det.location_data.relative_bounding_box
+            box = _clip_box(bbox.xmin * width, bbox.ymin * height, bbox.width * width, bbox.height * height, width, height)
+            if box is None: continue
+            landmarks = [(int(kp.x * width), int(kp.y * height)) for kp in det.location_data.relative_keypoints]
+            detections.append(Detection(box, float(det.score[0]), landmarks))
+        return detections
+
+    def close(self):
+        self.model.close()
+
+class HaarDetector:
+    default_confidence = 0.0 # Haar gives no scores; every hit is reported with score 1.0
+
+    def __init__(self, min_confidence=None):
+        self.cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.lock = threading.Lock() # CascadeClassifier is not safe to share across threads
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        with self.lock:
+            faces = self.cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=5, minSize=(30, 30))
+        # Largest face first
+        faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
+        detections = []
+        for (x, y, w, h) in faces:
+            box = _clip_box(x, y, w, h, width, height)
+            if box is not None:
+                detections.append(Detection(box, 1.0, []))
+        return detections
+
+    def close(self):
+        pass
+
+class DnnDetector:
+    default_confidence = 0.5
+
+    def __init__(self, min_confidence=None):
+        if not (os.path.exists(DNN_PROTOTXT) and os.path.exists(DNN_MODEL)):
+            raise RuntimeError(
+                f"DNN face detector files not found ({DNN_PROTOTXT}, {DNN_MODEL}). "
+                "Download the OpenCV res10_300x300_ssd model or set DNN_PROTOTXT / DNN_MODEL."
+            )
+        self.net = cv2.dnn.readNetFromCaffe(DNN_PROTOTXT, DNN_MODEL)
+        self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+        self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+        self.min_confidence = min_confidence if min_confidence is not None else self.default_confidence
+        self.lock = threading.Lock() # cv2.dnn.Net keeps per-call state
+
+    def detect(self, image):
+        height, width = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        with self.lock:
+            self.net.setInput(blob)
+            out = self.net.forward()
+
+        detections = []
+        for i in range(out.shape[2]):
+            score = float(out[0, 0, i, 2])
+            if score < self.min_confidence: continue
+            x1, y1, x2, y2 = out[0, 0, i, 3:7] * np.array([width, height, width, height])
+            box = _clip_box(x1, y1, x2 - x1, y2 - y1, width, height)
+            if box is not None:
+                detections.append(Detection(box, score, []))
+        return sorted(detections, key=lambda d: d.score, reverse=True)
+
+    def close(self):
+        pass
+
+BACKENDS = {
+    "mediapipe_short": lambda conf: MediaPipeDetector(0, conf),
+    "mediapipe_full": lambda conf: MediaPipeDetector(1, conf),
+    "haar": HaarDetector,
+    "dnn": DnnDetector,
+}
+
+# ==== SERVICE ====
+
+_detectors: Dict[Tuple[str, Optional[float]], object] = {}
+_detectors_lock = threading.Lock()
+
+def get_detector(name, min_confidence=None):
+    """
+    Returns a shared detector instance for a backend name and confidence threshold.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown face detector '{name}'. Choose from: {', '.join(BACKENDS)}")
+    key = (name, min_confidence)
+    with _detectors_lock:
+        if key not in _detectors:
+            print(f"[INFO] Initializing face detector: {name}")
+            _detectors[key] = BACKENDS[name](min_confidence)
+        return _detectors[key]
+
+_thread_detectors = threading.local()
+
+def get_thread_detector(name, min_confidence=None):
+    """
+    Returns a detector owned by the calling thread. Threadpool workers each build their
+    own instance once and reuse it, so concurrent requests run inference in parallel
+    instead of queueing on the lock of one shared instance.
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown face detector '{name}'. Choose from: {', '.join(BACKENDS)}")
+    pool = getattr(_thread_detectors, "pool", None)
+    if pool is None:
+        pool = _thread_detectors.pool = {}
+    key = (name, min_confidence)
+    if key not in pool:
+        print(f"[INFO] Initializing face detector: {name} for thread {threading.get_ident()}")
+        detector = BACKENDS[name](min_confidence)
+        detector.lock = nullcontext() # Never shared, so no need to serialize calls
+        pool[key] = detector
+    return pool[key]
+
+def detect_faces(image, name, min_confidence=None):
+    return get_detector(name, min_confidence).detect(image)
+
+def warm_up(specs, thread_local=False):
+    """
+    Builds each (name, min_confidence) detector and runs one inference on a blank frame,
+    so graph/model initialization happens at startup instead of on the first request.
+    With thread_local=True the calling thread's own instances (get_thread_detector) are warmed.
+    Returns { name: seconds }.
+    """
+    blank = np.zeros((240, 320, 3), dtype=np.uint8)
+    get = get_thread_detector if thread_local else get_detector
+    timings = {}
+    for name, min_confidence in specs:
+        start = time.perf_counter()
+        get(name, min_confidence).detect(blank)
+        timings[name] = round(time.perf_counter() - start, 3)
+        print(f"[INFO] Warmed up face detector {name} in {timings[name]}s")
+    return timings
+
+# ==== BENCHMARK ====
+
+def _load_sample_set(sample_dir):
+    valid_extensions = {".jpg", ".jpeg", ".png"}
+    paths = sorted(
+        p for p in glob.glob(os.path.join(sample_dir, "**", "*.*"), recursive=True)
+        if os.path.splitext(p)[1].lower() in valid_extensions
+    )
+    images = []
+    for p in paths:
+        img = cv2.imread(p)
+        if img is not None:
+            images.append(img)
+    return images
+
+def benchmark(images, names, repeat=1):
+    """
+    Times each backend over a sample set where every image contains a face.
+    Recall is the fraction of images with at least one detection.
+    """
+    results = []
+    for name in names:
+        try:
+            detector = BACKENDS[name](None)
+        except Exception as e:
+            results.append({"backend": name, "error": str(e)})
+            continue
+
+        detector.detect(images[0]) # Warm-up (graph / network initialization)
+        latencies = []
+        found = 0
+        for _ in range(repeat):
+            found = 0
+            for img in images:
+                start = time.perf_counter()
+                dets = detector.detect(img)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if dets: found += 1
+        detector.close()
+
+        results.append({
+            "backend": name,
+            "images": len(images),
+            "recall": round(found / len(images), 4),
+            "mean_ms": round(float(np.mean(latencies)), 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="Measure latency and recall per backend on a directory of face images")
+    bench.add_argument("sample_dir")
+    bench.add_argument("--backends", default=",".join(BACKENDS))
+    bench.add_argument("--repeat", type=int, default=1)
+    bench.add_argument("--json", dest="json_path", help="Also write results to this file")
+    args = parser.parse_args()
+
+    images = _load_sample_set(args.sample_dir)
+    if not images:
+        parser.error(f"No images found in {args.sample_dir}")
+
+    results = benchmark(images, args.backends.split(","), args.repeat)
+    print(f"{'backend':<16} {'recall':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<16} skipped: {r['error']}")
+        else:
+            print(f"{r['backend']:<16} {r['recall']:>7.3f} {r['mean_ms']:>9.2f} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
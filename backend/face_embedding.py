@@ -0,0 +1,159 @@
+import os
+import struct
+
+import cv2
+import numpy as np
+from bson.binary import Binary
+
+try:
+    from .face_detector import get_detector, crop
+except ImportError: # standalone_attendance.py runs from inside backend/
+    from face_detector import get_detector, crop
+
+# Histogram face 'embedding' used by app.py's gallery, bulk enrollment and the standalone kiosk.
+# Kept free of app state (no FastAPI / Mongo imports) so it can run inside a process pool.
+#
+# Every stored embedding is tagged with the recipe version that produced it:
+#
+#   student["faceEmbeddings"] = [Binary, ...], student["embeddingVersion"] = 1
+#
+# While a backfill re-embeds students for a new recipe, it writes the new vectors next to the
+# old ones, keyed by version, and only moves them into faceEmbeddings once the run is complete:
+#
+#   student["faceEmbeddingsByVersion"] = {"2": [Binary, ...]}
+#
+# Each embedding is stored packed (see pack_embedding): a 6-byte header (format, dtype code,
+# rows, cols as little-endian uint16) followed by the little-endian float32 / float16 values.
+# Documents written earlier hold plain lists of doubles; unpack_embedding reads both.
+#
+# Histograms from different recipes are not comparable, so a live face is embedded with every
+# recipe the gallery still holds and each student is matched on the newest version they have
+# (see stored_embeddings). To change the recipe, add it to RECIPES, bump EMBEDDING_VERSION and
+# re-embed stored samples in the background while the server keeps running:
+#   python -m backend.embedding_backfill --url http://127.0.0.1:8001
+
+HIST_BINS = [32, 32] # H x S bins; stored embeddings are the flattened 32x32 matrix
+FACE_SIZE = (128, 128)
+
+# Enrollment sample images, one folder per student id; the source for re-embedding
+SAMPLES_DIR = os.getenv("ENROLLMENT_SAMPLES_DIR", "backend/enrollment_samples")
+
+def _hs_histogram_v1(face_crop):
+    face_crop = cv2.resize(face_crop, FACE_SIZE)
+    hsv_crop = cv2.cvtColor(face_crop, cv2.COLOR_BGR2HSV)
+    # Using 32x32 H-S histogram for better performance/accuracy balance
+    hist = cv2.calcHist([hsv_crop], [0, 1], None, HIST_BINS, [0, 180, 0, 256])
+    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
+    return hist
+
+RECIPES = {
+    1: _hs_histogram_v1, # 128x128 resize, 32x32 H-S histogram, MINMAX normalize
+}
+EMBEDDING_VERSION = 1
+LEGACY_VERSION = 1 # Documents written before versioning used recipe 1
+VERSIONED_FIELD = "faceEmbeddingsByVersion" # { "<version>": [embeddings] } staged by a running backfill
+
+# ==== STORAGE ====
+
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "float32") # float16 halves the size again
+BINARY_SUBTYPE = 0x80 # User-defined BSON binary subtype
+_HEADER = struct.Struct("<BBHH") # format, dtype code, rows, cols
+_FORMAT = 1
+_DTYPES = {1: np.dtype("<f4"), 2: np.dtype("<f2")}
+_DTYPE_CODES = {"float32": 1, "float16": 2}
+
+def pack_embedding(hist, dtype=None):
+    """
+    Packs a 2-D histogram into BSON binary: header + raw little-endian values.
+    """
+    code = _DTYPE_CODES[dtype or EMBEDDING_DTYPE]
+    rows, cols = hist.shape[:2]
+    data = np.ascontiguousarray(hist, dtype=_DTYPES[code]).tobytes()
+    return Binary(_HEADER.pack(_FORMAT, code, rows, cols) + data, BINARY_SUBTYPE)
+
+def unpack_embedding(value):
+    """
+    Returns a float32 (rows, cols) matrix for a packed embedding or a legacy list of doubles.
+    Packed float32 is decoded without copying (the array is read-only).
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        fmt, code, rows, cols = _HEADER.unpack_from(value)
+        if fmt != _FORMAT or code not in _DTYPES:
+            raise ValueError(f"Unknown embedding encoding (format {fmt}, dtype {code})")
+        matrix = np.frombuffer(value, dtype=_DTYPES[code], count=rows * cols, offset=_HEADER.size).reshape(rows, cols)
+        return matrix if code == 1 else matrix.astype(np.float32)
+    return np.array(value, dtype=np.float32).reshape(HIST_BINS)
+
+def embedding_version(student):
+    return student.get("embeddingVersion", LEGACY_VERSION)
+
+def is_current(student):
+    return embedding_version(student) == EMBEDDING_VERSION
+
+def current_version_query():
+    """
+    Mongo filter for students whose faceEmbeddings were made with the current recipe.
+    """
+    if EMBEDDING_VERSION == LEGACY_VERSION:
+        return {"embeddingVersion": {"$in": [EMBEDDING_VERSION, None]}} # None also matches a missing field
+    return {"embeddingVersion": EMBEDDING_VERSION}
+
+def staged_key(version=None):
+    return f"{VERSIONED_FIELD}.{version or EMBEDDING_VERSION}"
+
+def has_current_query():
+    """
+    Mongo filter for students with current-recipe embeddings, in faceEmbeddings or staged by a backfill.
+    """
+    return {"$or": [current_version_query(), {staged_key(): {"$exists": True}}]}
+
+def stored_embeddings(student):
+    """
+    Returns (version, [stored embeddings]) to match a student document with: current-version
+    embeddings staged by a backfill if there are any, else faceEmbeddings (or the legacy single
+    faceEmbedding) with their recorded version.
+    """
+    staged = (student.get(VERSIONED_FIELD) or {}).get(str(EMBEDDING_VERSION))
+    if staged:
+        return EMBEDDING_VERSION, staged
+    embeddings = student.get("faceEmbeddings") or []
+    if not embeddings and student.get("faceEmbedding") is not None:
+        embeddings = [student["faceEmbedding"]]
+    return embedding_version(student), embeddings
+
+def compute_histogram(face_crop):
+    """
+    Histogram 'embedding' of an already cropped BGR face, using the current recipe.
+    """
+    return RECIPES[EMBEDDING_VERSION](face_crop)
+
+def compute_histograms(face_crop, versions):
+    """
+    { version: histogram } of an already cropped BGR face for each of the given recipe versions.
+    """
+    return {version: RECIPES[version](face_crop) for version in versions}
+
+def embed_image(image, detector_name, min_confidence=None):
+    """
+    Detects the first face in a BGR image and returns its histogram, or None.
+    """
+    detections = get_detector(detector_name, min_confidence).detect(image)
+    if not detections:
+        return None
+    face_crop = crop(image, detections[0])
+    if face_crop.size == 0:
+        return None
+    return compute_histogram(face_crop)
+
+def samples_dir(student_id, base_dir=None):
+    return os.path.join(base_dir or SAMPLES_DIR, str(student_id))
+
+def save_samples(student_id, images, base_dir=None):
+    """
+    Keeps the encoded enrollment images [(bytes, ext)] so embeddings can be recomputed later.
+    """
+    folder = samples_dir(student_id, base_dir)
+    os.makedirs(folder, exist_ok=True)
+    for idx, (data, ext) in enumerate(images):
+        with open(os.path.join(folder, f"sample_{idx}{ext}"), "wb") as f:
+            f.write(data)
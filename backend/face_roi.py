@@ -0,0 +1,119 @@
+import os
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+from .face_detector import get_thread_detector, crop
+
+# Face ROI extraction for LBPH training.
+# Kept free of app state (no FastAPI / Mongo imports) so it can run inside a process pool.
+
+ROI_SIZE = (100, 100)
+
+# Backends: haar, mediapipe_short, mediapipe_full, dnn (see backend/face_detector.py)
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "haar")
+# Part of every cache file name: crops from another detector or ROI size are never reused
+CACHE_TAG = f"{FACE_DETECTOR}-{ROI_SIZE[0]}x{ROI_SIZE[1]}"
+# Below this many uncached images, spawning a process pool costs more than it saves
+POOL_MIN_MISSES = int(os.getenv("ROI_POOL_MIN_MISSES", "16"))
+
+def get_face_roi(image):
+    """
+    Returns the detected face region (grayscale) or None.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    faces = get_thread_detector(FACE_DETECTOR).detect(image)
+
+    if len(faces) == 0:
+        # Fallback: Center Crop
+        h, w = gray.shape
+        cy, cx = h // 2, w // 2
+        crop_h, crop_w = min(h, 200), min(w, 200)
+        y = cy - crop_h // 2
+        x = cx - crop_w // 2
+        return gray[y:y+crop_h, x:x+crop_w]
+
+    # Largest Face
+    largest = max(faces, key=lambda f: f.box[2] * f.box[3])
+    return crop(gray, largest)
+
+def _init_worker():
+    # One OpenCV thread per process; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+def _extract_roi(img_path, cache_path):
+    """
+    Detects the face in one image file, writes the 100x100 ROI to the cache and returns it.
+    """
+    img = cv2.imread(img_path)
+    if img is None: return None
+
+    face_roi = get_face_roi(img)
+    if face_roi is None or face_roi.size == 0: return None
+
+    face_roi = cv2.resize(face_roi, ROI_SIZE)
+    tmp_path = cache_path + ".tmp.png"
+    if cv2.imwrite(tmp_path, face_roi):
+        os.replace(tmp_path, cache_path)
+    return face_roi
+
+def _file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def extract_rois(image_paths, cache_dir, workers=None, prune=False, progress=None):
+    """
+    Returns a list of 100x100 grayscale ROIs aligned with image_paths (None for unusable images).
+    ROIs are cached on disk keyed by the image's content hash plus CACHE_TAG, so only unseen
+    images are decoded and run through the detector, spread across a process pool.
+    With prune=True, cache entries not referenced by image_paths are deleted.
+    progress, if given, is called with the number of images completed since the last call.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    rois = [None] * len(image_paths)
+    misses = [] # (index, img_path, cache_path)
+    used = set()
+    hits = 0
+
+    for idx, img_path in enumerate(image_paths):
+        try:
+            key = _file_hash(img_path)
+        except OSError:
+            continue
+        cache_path = os.path.join(cache_dir, f"{key}-{CACHE_TAG}.png")
+        used.add(os.path.basename(cache_path))
+
+        if os.path.exists(cache_path):
+            cached = cv2.imread(cache_path, cv2.IMREAD_GRAYSCALE)
+            if cached is not None:
+                rois[idx] = cached
+                hits += 1
+                continue
+        misses.append((idx, img_path, cache_path))
+
+    if progress:
+        progress(len(image_paths) - len(misses))
+
+    if len(misses) >= POOL_MIN_MISSES and workers != 1:
+        # Spawned (not forked) workers: training runs on a background thread of a threaded server
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker) as pool:
+            results = pool.map(_extract_roi, [m[1] for m in misses], [m[2] for m in misses], chunksize=8)
+            for (idx, _, _), roi in zip(misses, results):
+                rois[idx] = roi
+                if progress: progress(1)
+    else:
+        for idx, img_path, cache_path in misses:
+            rois[idx] = _extract_roi(img_path, cache_path)
+            if progress: progress(1)
+
+    if prune:
+        for name in os.listdir(cache_dir):
+            if name not in used:
+                try: os.remove(os.path.join(cache_dir, name))
+                except OSError: pass
+
+    print(f"[INFO] Face ROIs: {hits} cached, {len(misses)} extracted.")
+    return rois
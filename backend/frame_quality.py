@@ -0,0 +1,75 @@
+import os
+from typing import NamedTuple, Optional
+
+import cv2
+
+# Cheap frame-quality gate run before face detection.
+# Frames are checked on a small grayscale copy (a fraction of a millisecond), and hopeless ones
+# (too dark, overexposed, blank, blurred) are rejected with a reason code so the kiosk can
+# ask for a retake right away instead of paying for detection and a gallery scan.
+#
+#   quality = check_frame(img)
+#   if not quality.ok: return {"status": "fail", "reason": quality.reason, "message": quality.message}
+#
+# Thresholds are tuned for webcam frames; set FRAME_QUALITY_GATE=0 to disable the gate.
+
+QUALITY_GATE = os.getenv("FRAME_QUALITY_GATE", "1") != "0"
+CHECK_WIDTH = 160 # Frames are downscaled to this width before measuring
+MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "40")) # Mean gray level, 0-255
+MAX_BRIGHTNESS = float(os.getenv("QUALITY_MAX_BRIGHTNESS", "225"))
+MIN_CONTRAST = float(os.getenv("QUALITY_MIN_CONTRAST", "12")) # Gray level std-dev; lower = blank / covered lens
+MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "25")) # Variance of the Laplacian at CHECK_WIDTH
+
+MESSAGES = {
+    "too_dark": "Image too dark. Improve lighting and retake.",
+    "overexposed": "Image overexposed. Avoid direct light and retake.",
+    "low_contrast": "Image is blank or washed out. Check the camera and retake.",
+    "blurry": "Image is blurry. Hold still and retake.",
+}
+
+class FrameQuality(NamedTuple):
+    ok: bool
+    reason: Optional[str] # One of MESSAGES, None if ok
+    brightness: float
+    contrast: float
+    sharpness: float
+
+    @property
+    def message(self):
+        return MESSAGES.get(self.reason, "")
+
+    def metrics(self):
+        return {"brightness": round(self.brightness, 1), "contrast": round(self.contrast, 1), "sharpness": round(self.sharpness, 1)}
+
+def measure(image):
+    """
+    Returns (brightness, contrast, sharpness) of a BGR or grayscale frame.
+    """
+    height, width = image.shape[:2]
+    if width > CHECK_WIDTH:
+        # Nearest-neighbour keeps the downscale cheap and does not smooth away blur evidence
+        small = cv2.resize(image, (CHECK_WIDTH, max(1, round(height * CHECK_WIDTH / width))), interpolation=cv2.INTER_NEAREST)
+    else:
+        small = image
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    mean, std = cv2.meanStdDev(gray)
+    _, lap_std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_16S))
+    return float(mean[0][0]), float(std[0][0]), float(lap_std[0][0]) ** 2
+
+def check_frame(image):
+    """
+    Grades a decoded frame. Checks run from cheapest signal to most specific, first failure wins.
+    """
+    brightness, contrast, sharpness = measure(image)
+    reason = None
+    if brightness < MIN_BRIGHTNESS:
+        reason = "too_dark"
+    elif brightness > MAX_BRIGHTNESS:
+        reason = "overexposed"
+    elif contrast < MIN_CONTRAST:
+        reason = "low_contrast"
+    elif sharpness < MIN_SHARPNESS:
+        reason = "blurry"
+    if not QUALITY_GATE:
+        reason = None
+    return FrameQuality(reason is None, reason, brightness, contrast, sharpness)
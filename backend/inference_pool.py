@@ -0,0 +1,47 @@
+import os
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .face_detector import warm_up
+
+# Fixed thread pool for detection and matching.
+# The shared anyio threadpool retires idle workers and starts new ones, so per-thread detectors
+# (get_thread_detector) built there keep going cold. Threads of this pool live as long as the
+# process, and warm() builds and warms every thread's own detectors before the instance is ready.
+# Size it to the admission limit, which already caps concurrent recognitions:
+#
+#   inference = InferencePool(admission.max_in_flight)
+#   inference.warm([("mediapipe_short", 0.4)], readiness)   # at startup, off the event loop
+#   hist = await inference.run(get_face_embedding, img)
+
+class InferencePool:
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 4
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+
+    async def run(self, func, *args):
+        """
+        Like run_in_threadpool, but on this pool. The caller's context is copied so timed()
+        stages and the admission ticket still apply inside func.
+        """
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(context.run, func, *args))
+
+    def warm(self, specs, readiness=None, component="detectors"):
+        """
+        Warms the (name, min_confidence) detectors of every pool thread; blocks until done.
+        Progress is reported per thread to readiness, if given.
+        """
+        if readiness: readiness.start(component, total=self.workers)
+        # The barrier holds each warm-up task until all have started, so every one lands on its own thread
+        barrier = threading.Barrier(self.workers)
+        def warm_thread():
+            barrier.wait(timeout=60)
+            warm_up(specs, thread_local=True)
+            if readiness: readiness.advance(component)
+        for future in [self.executor.submit(warm_thread) for _ in range(self.workers)]:
+            future.result()
+        if readiness: readiness.finish(component)
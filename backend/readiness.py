@@ -0,0 +1,62 @@
+import threading
+import time
+
+# Startup readiness for the /ready probe.
+# Each component (detector warm-up, gallery load, ...) reports its progress; the instance
+# is ready once every component has completed at least once. Later reloads update the
+# progress counters but do not take a warm instance out of rotation.
+#
+#   readiness = Readiness("detectors", "gallery")
+#   readiness.start("gallery", total=len(files)); readiness.advance("gallery"); readiness.finish("gallery")
+
+class Readiness:
+    def __init__(self, *components):
+        self.lock = threading.Lock()
+        self.started = time.monotonic()
+        self.components = {
+            name: {"state": "pending", "done": 0, "total": None, "error": None, "ready_after_seconds": None}
+            for name in components
+        }
+
+    def start(self, name, total=None):
+        with self.lock:
+            c = self.components[name]
+            c.update(state="loading", done=0, total=total, error=None)
+
+    def set_total(self, name, total):
+        with self.lock:
+            self.components[name]["total"] = total
+
+    def advance(self, name, n=1):
+        with self.lock:
+            self.components[name]["done"] += n
+
+    def finish(self, name):
+        with self.lock:
+            c = self.components[name]
+            c["state"] = "ready"
+            if c["total"] is None:
+                c["total"] = c["done"]
+            if c["ready_after_seconds"] is None:
+                c["ready_after_seconds"] = round(time.monotonic() - self.started, 3)
+
+    def fail(self, name, error):
+        with self.lock:
+            self.components[name].update(state="failed", error=str(error))
+
+    def is_ready(self):
+        with self.lock:
+            return all(c["ready_after_seconds"] is not None for c in self.components.values())
+
+    def status(self):
+        with self.lock:
+            components = {}
+            for name, c in self.components.items():
+                entry = dict(c)
+                entry["progress"] = round(c["done"] / c["total"], 3) if c["total"] else (1.0 if c["state"] == "ready" else 0.0)
+                components[name] = entry
+            return {
+                "ready": all(c["ready_after_seconds"] is not None for c in self.components.values()),
+                "uptime_seconds": round(time.monotonic() - self.started, 3),
+                "components": components,
+            }
@@ -0,0 +1,123 @@
+import os
+import contextvars
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# Per-request stage timings for the recognition endpoints.
+# Every response gets a Server-Timing header; requests slower than SLOW_REQUEST_MS
+# also have their decoded frame and timings saved to a bounded ring buffer on disk,
+# replayable offline with:  python -m backend.benchmarks.replay_captures
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0")) # 0 = capture disabled
+SLOW_CAPTURE_DIR = os.getenv("SLOW_CAPTURE_DIR", "backend/slow_captures")
+SLOW_CAPTURE_MAX = int(os.getenv("SLOW_CAPTURE_MAX", "200"))
+
+class RequestTrace:
+    def __init__(self, path):
+        self.path = path
+        self.stages = {} # { stage: milliseconds } (repeated stages are summed)
+        self.frame = None # Raw encoded frame bytes, kept for slow-request capture
+
+    def add(self, stage, ms):
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+def current_trace():
+    return _current_trace.get()
+
+@contextmanager
+def timed(histogram, stage):
+    """
+    Observes the stage duration in `histogram` and records it on the current request, if any.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, elapsed * 1000)
+
+def attach_frame(frame_bytes):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.frame = frame_bytes
+
+def server_timing_header(stages, total_ms):
+    parts = [f"{name};dur={ms:.2f}" for name, ms in stages.items()]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+class SlowRequestRecorder:
+    """
+    Saves frames of slow requests as <id>.jpg + <id>.json, keeping only the newest max_entries.
+    """
+    def __init__(self, directory, max_entries):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.seq = 0
+
+    def capture(self, trace, total_ms, status_code):
+        if trace.frame is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            self.seq += 1
+            capture_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{self.seq:04d}"
+            with open(os.path.join(self.directory, f"{capture_id}.jpg"), "wb") as f:
+                f.write(trace.frame)
+            with open(os.path.join(self.directory, f"{capture_id}.json"), "w") as f:
+                json.dump({
+                    "id": capture_id,
+                    "path": trace.path,
+                    "status": status_code,
+                    "total_ms": round(total_ms, 3),
+                    "stages_ms": {k: round(v, 3) for k, v in trace.stages.items()},
+                    "captured_at": datetime.now().isoformat(timespec="seconds"),
+                }, f, indent=2)
+            self._prune()
+
+    def _prune(self):
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+        for old_id in ids[:max(0, len(ids) - self.max_entries)]:
+            for ext in (".jpg", ".json"):
+                try: os.remove(os.path.join(self.directory, old_id + ext))
+                except OSError: pass
+
+def install_timing_middleware(app, paths):
+    """
+    Adds Server-Timing headers (and slow-request capture when SLOW_REQUEST_MS > 0) to `paths`.
+    """
+    recorder = SlowRequestRecorder(SLOW_CAPTURE_DIR, SLOW_CAPTURE_MAX) if SLOW_REQUEST_MS > 0 else None
+    paths = set(paths)
+
+    @app.middleware("http")
+    async def server_timing(request, call_next):
+        if request.url.path not in paths:
+            return await call_next(request)
+
+        trace = RequestTrace(request.url.path)
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            response = await call_next(request)
+        finally:
+            _current_trace.reset(token)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        response.headers["Server-Timing"] = server_timing_header(trace.stages, total_ms)
+        if recorder and total_ms >= SLOW_REQUEST_MS:
+            try:
+                recorder.capture(trace, total_ms, response.status_code)
+            except Exception as e:
+                print(f"[WARNING] Slow request capture failed: {e}")
+        return response
+
+    return recorder
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from .admission import CLIENT_HEADER, SESSION_HEADER
+
+# Short-lived recognition result cache for the live-check loop.
+# A student standing still sends near-identical frames every second; each frame is reduced to a
+# 256-bit difference hash (16x16 gradient signs of a tiny grayscale copy, ~0.1 ms) and a frame
+# within a few bits of a recent one reuses that frame's result instead of detecting and matching.
+#
+#   key, scope = frame_hash(img), cache_scope(request)
+#   cached = result_cache.get(key, gallery_version, scope)
+#   ...
+#   result_cache.put(key, gallery_version, result, scope)
+#
+# Results are only reused within one scope (the requester's X-Session-Id, else X-Client-Id, else
+# IP address): two cameras looking at similar scenes must not get each other's answers.
+# Entries live RESULT_CACHE_TTL seconds and are dropped whenever the gallery version changes,
+# so enrollments and deletions are never answered from stale results.
+
+HASH_SIZE = 16 # HASH_SIZE x HASH_SIZE bits
+CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "2.0"))
+MAX_DISTANCE = int(os.getenv("RESULT_CACHE_MAX_DISTANCE", "16")) # Hamming bits out of 256; 0 = exact only
+
+def frame_hash(image):
+    """
+    Perceptual difference hash of a BGR frame as an int.
+    """
+    # Bilinear sampling down to 8x the hash grid is cheap on any frame size; area-averaging
+    # that small copy then smooths out sensor noise and JPEG artefacts
+    small = cv2.resize(image, ((HASH_SIZE + 1) * 8, HASH_SIZE * 8), interpolation=cv2.INTER_LINEAR)
+    small = cv2.resize(small, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def cache_scope(request):
+    """
+    Who may reuse a cached result: one live-check tab (X-Session-Id), else one kiosk
+    (X-Client-Id), else one IP address.
+    """
+    headers = request.headers
+    if headers.get(SESSION_HEADER):
+        return "session:" + headers[SESSION_HEADER]
+    if headers.get(CLIENT_HEADER):
+        return "client:" + headers[CLIENT_HEADER]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+class ResultCache:
+    """
+    Size-bounded LRU of ((scope, frame hash) -> result) with a TTL, scoped to one gallery version.
+    """
+    def __init__(self, size=CACHE_SIZE, ttl=CACHE_TTL, max_distance=MAX_DISTANCE):
+        self.size = size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.lock = threading.Lock()
+        self.entries = OrderedDict() # { (scope, hash): (expires_at, result) }, least recent first
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.size > 0 and self.ttl > 0
+
+    def _sync_version(self, version):
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, frame, version, scope=None):
+        """
+        Returns the cached result for this frame hash (or a near-duplicate) from the same scope, else None.
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        key = (scope, frame)
+        with self.lock:
+            self._sync_version(version)
+            found = self.entries.get(key)
+            if found is not None and found[0] < now:
+                del self.entries[key]
+                found = None
+            if found is None and self.max_distance:
+                # A linear scan is fine: the cache holds a few hundred ints at most.
+                # Expired entries are skipped, so a newer near-duplicate further down still counts
+                for other, entry in reversed(self.entries.items()):
+                    if other[0] == scope and entry[0] >= now and hamming(frame, other[1]) <= self.max_distance:
+                        key, found = other, entry
+                        break
+            if found is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return found[1]
+
+    def put(self, frame, version, result, scope=None):
+        if not self.enabled:
+            return
+        key = (scope, frame)
+        with self.lock:
+            self._sync_version(version)
+            self.entries[key] = (time.monotonic() + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -2,138 +2,455 @@ import cv2
 import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 os.environ['PROTOCOL_BUFFERS_PYTHON_IMPLEMENTATION'] = 'python'
-import mediapipe as mp
+import argparse
+import base64
+import threading
+import time
 import numpy as np
+import requests
 from pymongo import MongoClient
 from datetime import datetime
+from face_detector import get_thread_detector, crop
+from attendance_rollups import record_mark_sync
+from face_embedding import compute_histogram, pack_embedding, unpack_embedding, stored_embeddings, has_current_query, EMBEDDING_VERSION, VERSIONED_FIELD
+
+# Standalone kiosk: marks attendance straight from one or more cameras, without the web app.
+# Every source (camera index, video file or stream URL) is read on its own thread, keeping only
+# its newest frame. KIOSK_WORKERS threads take those frames round-robin across sources, one
+# frame per source at a time, and match them against a single gallery shared by all cameras:
+#
+#   python standalone_attendance.py 0 1 rtsp://hall-cam-3/stream
+#
+# Per-source capture / processed fps are printed every KIOSK_STATS_INTERVAL seconds.
+# Keys in any camera window: 'q' quits, 'r' reloads the gallery.
+#
+# Edge mode: with --server the kiosk needs no Mongo access and keeps no gallery. It sends batches
+# of packed embeddings (~2 KB each) to the backend, which matches them and records attendance:
+#
+#   KIOSK_API_KEY=... python standalone_attendance.py 0 1 --server http://10.0.0.5:8001
 
 # ==== CONFIGURATIONS ====
 MONGO_URI = "mongodb://localhost:27017/vidya-rakshak"
 DB_NAME = "vidya-rakshak"
-THRESHOLD = 0.65 
+THRESHOLD = 0.65
+CAMERA_SOURCES = os.getenv("CAMERA_SOURCES", "0") # Comma separated; overridden by command-line sources
+KIOSK_WORKERS = int(os.getenv("KIOSK_WORKERS", "2")) # Frames processed in parallel across all sources
+STATS_INTERVAL = float(os.getenv("KIOSK_STATS_INTERVAL", "10"))
+
+# Edge mode (see backend/app.py /attendance/mark/embeddings)
+KIOSK_SERVER_URL = os.getenv("KIOSK_SERVER_URL", "")
+KIOSK_API_KEY = os.getenv("KIOSK_API_KEY", "")
+EDGE_BATCH_SIZE = int(os.getenv("EDGE_BATCH_SIZE", "16"))
+EDGE_FLUSH_MS = float(os.getenv("EDGE_FLUSH_MS", "250")) # Longest an embedding waits for its batch to fill
+EDGE_MIN_INTERVAL = float(os.getenv("EDGE_MIN_INTERVAL", "1.0")) # Seconds between sends per source
 
-# ==== INITIALIZE MEDIAPIPE ====
-mp_face_detection = mp.solutions.face_detection
-face_detection = mp_face_detection.FaceDetection(
-    model_selection=0,
-    min_detection_confidence=0.6
-)
+# ==== FACE DETECTION ====
+# Backends: mediapipe_short, mediapipe_full, haar, dnn (see face_detector.py)
+FACE_DETECTOR = os.getenv("FACE_DETECTOR", "mediapipe_short")
 
 # ==== DATABASE SETUP ====
 client = MongoClient(MONGO_URI)
 db = client[DB_NAME]
 students_collection = db["students"]
 attendance_collection = db["attendance"]
+rollup_collection = db["attendance_daily"]
 
 def get_face_embedding(face_img):
-    # Resize to match training/admin capture
-    face_img = cv2.resize(face_img, (128, 128))
-    hsv_face = cv2.cvtColor(face_img, cv2.COLOR_BGR2HSV)
-    # Using 32x32 H-S histogram to match backend/app.py
-    hist = cv2.calcHist([hsv_face], [0, 1], None, [32, 32], [0, 180, 0, 256])
-    cv2.normalize(hist, hist, 0, 1, cv2.NORM_MINMAX)
-    return hist.flatten().tolist()
-
-def compare_embeddings(emb1, emb2):
-    v1 = np.array(emb1, dtype=np.float32)
-    v2 = np.array(emb2, dtype=np.float32)
-    # Reshape to 32x32 as used in backend
-    return cv2.compareHist(v1.reshape(32, 32), v2.reshape(32, 32), cv2.HISTCMP_CORREL)
+    # Same versioned recipe as backend/app.py (see face_embedding.py)
+    return compute_histogram(face_img)
+
+_marked_lock = threading.Lock()
+_marked_today = set() # (studentId, date) already recorded by this process
 
 def mark_attendance(student):
     today = datetime.now().strftime("%Y-%m-%d")
     now_time = datetime.now().strftime("%H:%M:%S")
-    
-    query = {"studentName": student["name"], "date": today}
-    if attendance_collection.find_one(query):
-        return "Already Marked Today"
-    
-    attendance_collection.insert_one({
-        "studentId": student.get("_id"),
-        "studentName": student["name"],
-        "rollNo": student.get("rollNo", "N/A"),
-        "date": today,
-        "time": now_time,
-        "status": "Present"
-    })
+    key = (str(student.get("_id")), today)
+
+    # Several cameras can see the same student at once; only one of them records the mark
+    with _marked_lock:
+        if key in _marked_today:
+            return "Already Marked Today"
+        query = {"studentName": student["name"], "date": today}
+        if attendance_collection.find_one(query):
+            _marked_today.add(key)
+            return "Already Marked Today"
+
+        department = student.get("department", "General")
+        attendance_collection.insert_one({
+            "studentId": student.get("_id"),
+            "studentName": student["name"],
+            "rollNo": student.get("rollNo", "N/A"),
+            "department": department,
+            "date": today,
+            "time": now_time,
+            "status": "Present"
+        })
+        # Same daily rollup as backend/app.py, so kiosk marks show up in reports right away
+        record_mark_sync(rollup_collection, today, department, str(student["_id"]))
+        _marked_today.add(key)
     return f"Attendance Marked: {now_time}"
 
-def start_system():
-    print("[INFO] Fetching student embeddings from MongoDB...")
-    all_students = list(students_collection.find({}))
-    
-    if len(all_students) == 0:
-        print("[WARNING] No students found in MongoDB!")
-        print("[HINT] Register students through the Admin Portal first to generate embeddings.")
+# ==== SHARED GALLERY ====
+
+def _center_rows(matrix):
+    # HISTCMP_CORREL is the dot product of mean-centered, unit-length histograms
+    matrix = matrix - matrix.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+class Gallery:
+    """
+    Every current-version embedding in one matrix, shared by all sources and workers.
+    A lookup is a single matrix-vector product instead of a compareHist call per sample.
+    """
+    def __init__(self):
+        self.state = ([], np.empty(0, dtype=np.int32), np.empty((0, 0), dtype=np.float32))
+
+    def load(self, collection):
+        # Histograms from an older recipe are not comparable with live ones; current-version
+        # embeddings still staged by a running backfill count
+        projection = {"name": 1, "rollNo": 1, "department": 1, "faceEmbeddings": 1, "faceEmbedding": 1, "embeddingVersion": 1, VERSIONED_FIELD: 1}
+        students = list(collection.find(has_current_query(), projection))
+        rows, owners = [], []
+        for idx, student in enumerate(students):
+            _, embeddings = stored_embeddings(student)
+            for key in ("faceEmbeddings", "faceEmbedding", VERSIONED_FIELD):
+                student.pop(key, None)
+            for stored_emb in embeddings:
+                rows.append(unpack_embedding(stored_emb).ravel())
+                owners.append(idx)
+        matrix = _center_rows(np.array(rows, dtype=np.float32)) if rows else np.empty((0, 0), dtype=np.float32)
+        self.state = (students, np.array(owners, dtype=np.int32), matrix) # Swapped in one assignment
+        return len(students), len(rows)
+
+    def match(self, live_hist):
+        """
+        Returns (student, score) for the best HISTCMP_CORREL score, or (None, -1).
+        """
+        students, owners, matrix = self.state
+        if not len(owners):
+            return None, -1
+        scores = matrix @ _center_rows(live_hist.reshape(1, -1).astype(np.float32))[0]
+        best = int(np.argmax(scores))
+        return students[owners[best]], float(scores[best])
+
+# ==== SOURCES & SCHEDULING ====
+
+class CameraSource:
+    """
+    One camera, video file or stream, read on its own thread. Only the newest frame is kept.
+    """
+    def __init__(self, index, spec):
+        self.name = f"cam{index}"
+        self.spec = int(spec) if spec.isdigit() else spec
+        self.pending = None # Newest frame not yet taken by a worker
+        self.busy = False # A worker is processing one of this source's frames
+        self.alive = True
+        self.display = None # Last annotated frame
+        self.captured = 0
+        self.processed = 0
+        self.dropped = 0 # Frames replaced by a newer one before any worker took them
+        self.busy_seconds = 0.0
+
+    def run(self, scheduler, stop):
+        cap = cv2.VideoCapture(self.spec)
+        if not cap.isOpened():
+            print(f"[ERROR] {self.name}: could not open source {self.spec!r}")
+        # Files play back at their own frame rate instead of as fast as they decode
+        is_file = isinstance(self.spec, str) and os.path.exists(self.spec)
+        frame_gap = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 25) if is_file else 0
+        next_due = time.perf_counter()
+        while cap.isOpened() and not stop.is_set():
+            success, image = cap.read()
+            if not success: break
+            if isinstance(self.spec, int):
+                image = cv2.flip(image, 1) # Mirror webcams, as before
+            scheduler.put(self, image)
+            if frame_gap:
+                next_due += frame_gap
+                time.sleep(max(0, next_due - time.perf_counter()))
+        cap.release()
+        scheduler.finish(self)
+
+class Scheduler:
+    """
+    Hands out the newest pending frame of each source round-robin, at most one frame per source
+    in flight, so a busy or fast camera cannot starve the others and stale frames are skipped.
+    """
+    def __init__(self, sources):
+        self.sources = sources
+        self.cursor = 0
+        self.cond = threading.Condition()
+        self.stopped = False
+
+    def put(self, source, image):
+        with self.cond:
+            if source.pending is not None:
+                source.dropped += 1
+            source.pending = image
+            source.captured += 1
+            self.cond.notify()
+
+    def take(self):
+        """
+        Blocks until a frame is ready; returns (source, image), or (None, None) once done.
+        """
+        with self.cond:
+            while not self.stopped:
+                count = len(self.sources)
+                for step in range(count):
+                    source = self.sources[(self.cursor + step) % count]
+                    if source.pending is not None and not source.busy:
+                        image, source.pending = source.pending, None
+                        source.busy = True
+                        self.cursor = (self.cursor + step + 1) % count
+                        return source, image
+                if not self.active():
+                    break
+                self.cond.wait(0.5)
+            return None, None
+
+    def done(self, source, seconds):
+        with self.cond:
+            source.busy = False
+            source.processed += 1
+            source.busy_seconds += seconds
+            self.cond.notify()
+
+    def finish(self, source):
+        with self.cond:
+            source.alive = False
+            self.cond.notify_all()
+
+    def active(self):
+        return any(s.alive or s.pending is not None or s.busy for s in self.sources)
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+# ==== EDGE MODE ====
+
+class EdgeClient:
+    """
+    Batches embeddings from all sources and posts them to the backend on one thread.
+    The latest server answer per source is kept for the on-screen status.
+    """
+    def __init__(self, server_url, api_key, batch_size=EDGE_BATCH_SIZE, flush_ms=EDGE_FLUSH_MS, min_interval=EDGE_MIN_INTERVAL):
+        self.url = server_url.rstrip("/") + "/attendance/mark/embeddings"
+        self.http = requests.Session()
+        self.http.headers["X-Kiosk-Key"] = api_key
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000
+        self.min_interval = min_interval
+        self.cond = threading.Condition()
+        self.pending = []
+        self.last_sent = {} # { source name: monotonic time of its last send }
+        self.results = {} # { source name: [result per face of its last sent frame] }
+        self.stopped = False
+        self.sent = 0
+        self.failed_batches = 0
+
+    def submit(self, source_name, hists):
+        """
+        Queues one frame's face embeddings, at most once per min_interval per source.
+        """
+        if not hists:
+            return
+        now = time.monotonic()
+        with self.cond:
+            if now - self.last_sent.get(source_name, 0) < self.min_interval:
+                return
+            self.last_sent[source_name] = now
+            for idx, hist in enumerate(hists):
+                # float16 halves the payload; the server unpacks either width
+                packed = pack_embedding(hist, "float16")
+                self.pending.append({"embedding": base64.b64encode(bytes(packed)).decode(), "source": f"{source_name}#{idx}"})
+            self.cond.notify()
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.stopped:
+                    self.cond.wait()
+                if not self.pending:
+                    return
+                # Give a partial batch a moment to fill up
+                deadline = time.monotonic() + self.flush_seconds
+                while len(self.pending) < self.batch_size and not self.stopped and time.monotonic() < deadline:
+                    self.cond.wait(max(0, deadline - time.monotonic()))
+                batch, self.pending = self.pending[:self.batch_size], self.pending[self.batch_size:]
+            self._post(batch)
+
+    def _post(self, batch):
+        try:
+            res = self.http.post(self.url, json={"embeddingVersion": EMBEDDING_VERSION, "items": batch}, timeout=5)
+        except requests.RequestException as e:
+            self.failed_batches += 1
+            print(f"[WARNING] Edge batch of {len(batch)} not delivered: {e}")
+            return
+        if res.status_code == 409:
+            self.failed_batches += 1
+            print(f"[ERROR] Server expects embedding version {res.json().get('expected')}, kiosk sends {EMBEDDING_VERSION}. Update this kiosk.")
+            return
+        if res.status_code == 503:
+            # Server busy (admission control): back off; newer frames replace these anyway
+            self.failed_batches += 1
+            retry_after = float(res.headers.get("Retry-After", "1"))
+            print(f"[WARNING] Server busy, edge batch of {len(batch)} dropped; pausing {retry_after:.0f}s")
+            time.sleep(min(retry_after, 5))
+            return
+        if not res.ok:
+            self.failed_batches += 1
+            print(f"[WARNING] Edge batch rejected: {res.status_code} {res.text[:200]}")
+            return
+        self.sent += len(batch)
+        answers = {}
+        for result in res.json()["results"]:
+            source_name, _, idx = (result.get("source") or "").rpartition("#")
+            answers.setdefault(source_name, {})[int(idx or 0)] = result
+        with self.cond:
+            for source_name, by_face in answers.items():
+                self.results[source_name] = [by_face[i] for i in sorted(by_face)]
+
+    def stop(self):
+        with self.cond:
+            self.stopped = True
+            self.cond.notify_all()
+
+# ==== PROCESSING ====
+
+def process_frame(source, image, gallery, edge=None):
+    detections = get_thread_detector(FACE_DETECTOR, min_confidence=0.6).detect(image)
+    faces = [(detection.box, crop(image, detection)) for detection in detections]
+    faces = [(box, face_crop) for box, face_crop in faces if face_crop.size > 0]
+
+    if edge is not None:
+        # Matching happens on the server; show its latest answer for this camera
+        edge.submit(source.name, [get_face_embedding(face_crop) for _, face_crop in faces])
+        answers = edge.results.get(source.name, [])
+        for idx, ((x, y, w, h), _) in enumerate(faces):
+            answer = answers[idx] if idx < len(answers) else None
+            if answer and answer.get("status") == "success":
+                status_text, status_color = answer["student"]["name"], (0, 255, 0)
+                cv2.putText(image, answer.get("message", ""), (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+            elif answer:
+                status_text, status_color = answer.get("message", "Unknown Face"), (0, 0, 255)
+            else:
+                status_text, status_color = "Checking...", (255, 255, 255)
+            cv2.rectangle(image, (x, y), (x + w, y + h), status_color, 2)
+            cv2.putText(image, status_text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
+        return image
+
+    for (x, y, w, h), face_crop in faces:
+        best_match, max_score = gallery.match(get_face_embedding(face_crop))
+        if best_match is not None and max_score > THRESHOLD:
+            name = best_match["name"]
+            status_text = f"{name} ({int(max_score*100)}%)"
+            status_color = (0, 255, 0)
+            result_msg = mark_attendance(best_match)
+            cv2.putText(image, result_msg, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
+        else:
+            status_text = "Unknown Face"
+            status_color = (0, 0, 255)
+
+        cv2.rectangle(image, (x, y), (x + w, y + h), status_color, 2)
+        cv2.putText(image, status_text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
+    return image
+
+def worker(scheduler, gallery, edge):
+    while True:
+        source, image = scheduler.take()
+        if source is None: return
+        start = time.perf_counter()
+        try:
+            source.display = process_frame(source, image, gallery, edge)
+        except Exception as e:
+            print(f"[ERROR] {source.name}: {e}")
+        scheduler.done(source, time.perf_counter() - start)
+
+def report_stats(sources, previous, elapsed):
+    """
+    Prints per-source rates since the previous report; returns the new counters.
+    """
+    current = {}
+    for s in sources:
+        counts = (s.captured, s.processed, s.dropped, s.busy_seconds)
+        captured, processed, dropped, busy = (c - p for c, p in zip(counts, previous.get(s.name, (0, 0, 0, 0.0))))
+        ms_per_frame = busy / processed * 1000 if processed else 0
+        print(f"[INFO] {s.name} ({s.spec}): capture {captured / elapsed:.1f} fps, processed {processed / elapsed:.1f} fps, "
+              f"skipped {dropped / elapsed:.1f}/s, {ms_per_frame:.1f} ms/frame{'' if s.alive else ' (ended)'}")
+        current[s.name] = counts
+    return current
+
+def start_system(specs, workers=KIOSK_WORKERS, show=True, server_url=None, api_key=KIOSK_API_KEY):
+    gallery, edge = Gallery(), None
+    if server_url:
+        print(f"[INFO] Edge mode: sending version {EMBEDDING_VERSION} embeddings to {server_url}")
+        edge = EdgeClient(server_url, api_key)
     else:
-        print(f"[INFO] Loaded {len(all_students)} students.")
-
-    print("[INFO] Starting Webcam... Press 'q' in the window to quit.")
-    cap = cv2.VideoCapture(0)
-    
-    while cap.isOpened():
-        success, image = cap.read()
-        if not success: break
-
-        image = cv2.flip(image, 1)
-        rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        results = face_detection.process(rgb_image)
-        
-        status_text = "Scanning..."
-        status_color = (255, 255, 255)
-
-        if results.detections:
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                ih, iw, _ = image.shape
-                x, y, w, h = int(bbox.xmin * iw), int(bbox.ymin * ih), \
-                             int(bbox.width * iw), int(bbox.height * ih)
-                
-                x, y = max(0, x), max(0, y)
-                face_crop = image[y:y+h, x:x+w]
-                
-                if face_crop.size > 0:
-                    live_embedding = get_face_embedding(face_crop)
-                    best_match = None
-                    max_score = -1
-                    
-                    for student in all_students:
-                        # Normalize to list of embeddings
-                        student_embeddings = []
-                        if "faceEmbeddings" in student and student["faceEmbeddings"]:
-                            student_embeddings = student["faceEmbeddings"]
-                        elif "faceEmbedding" in student and student["faceEmbedding"]:
-                            student_embeddings = [student["faceEmbedding"]]
-                            
-                        # Compare against all stored embeddings for this student
-                        for stored_emb in student_embeddings:
-                            score = compare_embeddings(live_embedding, stored_emb)
-                            if score > max_score:
-                                max_score = score
-                                best_match = student
-                    
-                    if max_score > THRESHOLD:
-                        name = best_match["name"]
-                        status_text = f"{name} ({int(max_score*100)}%)"
-                        status_color = (0, 255, 0)
-                        result_msg = mark_attendance(best_match)
-                        cv2.putText(image, result_msg, (20, 40), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                    else:
-                        status_text = "Unknown Face"
-                        status_color = (0, 0, 255)
-
-                    cv2.rectangle(image, (x, y), (x + w, y + h), status_color, 2)
-                    cv2.putText(image, status_text, (x, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, status_color, 2)
-
-        cv2.imshow('Vidya Rakshak - Smart Attendance', image)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+        print("[INFO] Fetching student embeddings from MongoDB...")
+        student_count, sample_count = gallery.load(students_collection)
+
+        if student_count == 0:
+            print("[WARNING] No students found in MongoDB!")
+            print("[HINT] Register students through the Admin Portal first to generate embeddings.")
+        else:
+            print(f"[INFO] Loaded {student_count} students ({sample_count} samples).")
+
+    sources = [CameraSource(idx, spec) for idx, spec in enumerate(specs)]
+    scheduler = Scheduler(sources)
+    stop = threading.Event()
+    threads = [threading.Thread(target=s.run, args=(scheduler, stop), daemon=True) for s in sources]
+    threads += [threading.Thread(target=worker, args=(scheduler, gallery, edge), daemon=True) for _ in range(max(1, workers))]
+    for t in threads: t.start()
+    uploader = threading.Thread(target=edge.run, daemon=True) if edge else None
+    if uploader: uploader.start()
+    print(f"[INFO] Started {len(sources)} sources with {max(1, workers)} workers." + (" Press 'q' in a window to quit." if show else ""))
+
+    last_report, counters = time.perf_counter(), {}
+    try:
+        while scheduler.active():
+            if show:
+                for s in sources:
+                    if s.display is not None:
+                        cv2.imshow(f"Vidya Rakshak - Smart Attendance ({s.name})", s.display)
+                key = cv2.waitKey(1) & 0xFF
+                if key == ord('q'):
+                    break
+                if key == ord('r') and not edge:
+                    print("[INFO] Reloaded {} students ({} samples).".format(*gallery.load(students_collection)))
+            else:
+                time.sleep(0.05)
+            now = time.perf_counter()
+            if now - last_report >= STATS_INTERVAL:
+                counters = report_stats(sources, counters, now - last_report)
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        scheduler.stop()
+        for t in threads: t.join(timeout=2)
+        if uploader:
+            edge.stop() # Sends what is still queued first
+            uploader.join(timeout=10)
+            print(f"[INFO] Edge mode: {edge.sent} embeddings delivered, {edge.failed_batches} batches failed.")
+        report_stats(sources, counters, max(time.perf_counter() - last_report, 1e-3))
+        if show:
+            cv2.destroyAllWindows()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Standalone multi-camera attendance kiosk")
+    parser.add_argument("sources", nargs="*", help="Camera indexes, video files or stream URLs (default: CAMERA_SOURCES)")
+    parser.add_argument("--workers", type=int, default=KIOSK_WORKERS, help="Frames processed in parallel")
+    parser.add_argument("--no-window", action="store_true", help="Run headless, e.g. on a server with no display")
+    parser.add_argument("--server", default=KIOSK_SERVER_URL, help="Backend URL; enables edge mode (needs KIOSK_API_KEY)")
+    args = parser.parse_args()
     try:
-        start_system()
+        start_system(args.sources or [s.strip() for s in CAMERA_SOURCES.split(",") if s.strip()], args.workers, not args.no_window, args.server or None)
     except Exception as e:
         print(f"[ERROR] {e}")
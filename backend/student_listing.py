@@ -0,0 +1,85 @@
+import base64
+import json
+import re
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+# Paginated student listing shared by app.py and app_team.py.
+# Pages are ordered by (rollNo, _id) and continue from an opaque cursor, so page N costs
+# the same as page 1 (no skip). Embeddings are never fetched.
+#
+#   GET /students/?limit=50&department=IT&q=CS10&cursor=<nextCursor from the previous page>
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+LIST_FIELDS = {"name": 1, "rollNo": 1, "department": 1, "email": 1, "phone": 1, "profileImage": 1, "thumbnails": 1}
+
+# (keys, name) pairs; created at startup, matching the filters and sort below
+INDEXES = [
+    ([("rollNo", ASCENDING), ("_id", ASCENDING)], "rollNo_1__id_1"),
+    ([("department", ASCENDING), ("rollNo", ASCENDING), ("_id", ASCENDING)], "department_1_rollNo_1__id_1"),
+    ([("name", ASCENDING)], "name_1"),
+]
+
+def encode_cursor(doc):
+    raw = json.dumps([doc.get("rollNo"), str(doc["_id"])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """
+    Returns (rollNo, ObjectId), rollNo None for a student without one;
+    raises ValueError for a malformed cursor.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        roll_no, oid = json.loads(raw)
+        if roll_no is not None and not isinstance(roll_no, str):
+            raise TypeError(roll_no)
+        return roll_no, ObjectId(oid)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def build_query(department=None, q=None, cursor=None):
+    clauses = []
+    if department:
+        clauses.append({"department": department})
+    if q:
+        # Anchored, case-sensitive prefix so the rollNo / name indexes can bound the scan
+        prefix = "^" + re.escape(q)
+        clauses.append({"$or": [{"rollNo": {"$regex": prefix}}, {"name": {"$regex": prefix}}]})
+    if cursor:
+        roll_no, oid = decode_cursor(cursor)
+        if roll_no is None:
+            # A missing rollNo sorts before every string; {"rollNo": None} matches missing and null
+            clauses.append({"$or": [{"rollNo": {"$gte": ""}}, {"rollNo": None, "_id": {"$gt": oid}}]})
+        else:
+            clauses.append({"$or": [{"rollNo": {"$gt": roll_no}}, {"rollNo": roll_no, "_id": {"$gt": oid}}]})
+    if not clauses:
+        return {}
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+async def list_students(collection, limit=DEFAULT_PAGE_SIZE, cursor=None, department=None, q=None):
+    """
+    Returns one page: {"students": [...], "nextCursor": str | None}.
+    `collection` is an async (Motor-style) students collection.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = build_query(department, q, cursor)
+    # One extra document tells us whether another page exists
+    docs = await collection.find(query, LIST_FIELDS).sort([("rollNo", ASCENDING), ("_id", ASCENDING)]).limit(limit + 1).to_list(limit + 1)
+
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    for s in docs:
+        s["id"] = str(s["_id"]) # Frontend expects 'id'
+        s["_id"] = str(s["_id"])
+    return {
+        "students": docs,
+        "nextCursor": encode_cursor({"rollNo": docs[-1].get("rollNo"), "_id": docs[-1]["_id"]}) if has_more else None,
+    }
+
+async def ensure_indexes(collection):
+    for keys, name in INDEXES:
+        await collection.create_index(keys, name=name)
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend.admission import (AdmissionController, Abandoned, Rejected, Ticket, _current_ticket,
+                               abandoned_response, install_admission_control)
+
+async def _settle():
+    # Lets queued acquire() calls run up to their first await
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+def test_release_serves_waiting_clients_round_robin():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, max_queued_per_client=10, queue_timeout=5)
+        running = Ticket("kiosk-a")
+        await controller.acquire(running)
+
+        waiting = [Ticket("kiosk-a"), Ticket("kiosk-a"), Ticket("kiosk-b")]
+        tasks = [asyncio.create_task(controller.acquire(t)) for t in waiting]
+        await _settle()
+        assert controller.queued == 3
+
+        order = []
+        current = running
+        for _ in waiting:
+            controller.release(current)
+            await _settle()
+            current = next(t for t in waiting if t.running)
+            order.append(current)
+        controller.release(current)
+        await asyncio.gather(*tasks)
+        return order, waiting, controller
+
+    order, (a1, a2, b1), controller = asyncio.run(scenario())
+    # kiosk-b is served before kiosk-a's second request
+    assert order == [a1, b1, a2]
+    assert controller.in_flight == 0 and controller.queued == 0
+
+def test_full_queue_is_rejected_with_retry_after():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=0)
+        await controller.acquire(Ticket("a"))
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire(Ticket("b"))
+        return rejected.value
+
+    rejected = asyncio.run(scenario())
+    assert rejected.reason == "queue_full"
+    assert rejected.retry_after >= 1
+
+def test_queue_timeout_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=5, queue_timeout=0.01)
+        await controller.acquire(Ticket("a"))
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire(Ticket("b"))
+        return rejected.value, controller
+
+    rejected, controller = asyncio.run(scenario())
+    assert rejected.reason == "timeout"
+    assert controller.queued == 0
+
+def test_middleware_answers_503_with_retry_after_when_busy():
+    app = FastAPI()
+
+    @app.post("/face/recognize")
+    async def recognize():
+        return {"status": "success"}
+
+    controller = install_admission_control(app, ["/face/recognize"], AdmissionController(max_in_flight=1, max_queue=0))
+    client = TestClient(app)
+    assert client.post("/face/recognize").status_code == 200
+
+    controller.in_flight = 1 # Every slot taken by a request still running
+    response = client.post("/face/recognize")
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["reason"] == "queue_full"
+
+def test_newer_request_supersedes_queued_one_from_same_session():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_queue=10, queue_timeout=5)
+        await controller.acquire(Ticket("other"))
+        older = Ticket("tab", session="s1")
+        older_task = asyncio.create_task(controller.acquire(older))
+        await _settle()
+        newer_task = asyncio.create_task(controller.acquire(Ticket("tab", session="s1")))
+        await _settle()
+        with pytest.raises(Abandoned) as abandoned:
+            await older_task
+        newer_task.cancel()
+        return abandoned.value, older
+
+    abandoned, older = asyncio.run(scenario())
+    assert abandoned.reason == "superseded"
+    assert older.abandoned == "superseded"
+
+def test_superseded_running_request_gets_409_at_its_checkpoint():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2)
+        older = Ticket("tab", session="s1")
+        await controller.acquire(older)
+        token = _current_ticket.set(older)
+        try:
+            assert abandoned_response() is None
+            await controller.acquire(Ticket("tab", session="s1"))
+            return abandoned_response()
+        finally:
+            _current_ticket.reset(token)
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 409
+    assert b"superseded" in response.body
+
+def test_checkpoint_outside_admission_is_a_no_op():
+    assert abandoned_response() is None
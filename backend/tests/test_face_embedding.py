@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from bson import BSON
+
+from backend import face_embedding
+from backend.face_embedding import (EMBEDDING_VERSION, HIST_BINS, RECIPES, VERSIONED_FIELD, compute_histograms,
+                                    pack_embedding, stored_embeddings, unpack_embedding)
+
+@pytest.fixture
+def face_crop():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(150, 120, 3), dtype=np.uint8)
+
+@pytest.mark.parametrize("version", sorted(RECIPES))
+def test_float32_round_trip_is_exact(face_crop, version):
+    hist = compute_histograms(face_crop, [version])[version]
+    packed = pack_embedding(hist, "float32")
+    # Survives a trip through BSON, as it would through Mongo
+    stored = BSON.decode(BSON.encode({"e": packed}))["e"]
+    unpacked = unpack_embedding(stored)
+    assert unpacked.dtype == np.float32
+    assert unpacked.shape == hist.shape
+    assert np.array_equal(unpacked, hist)
+
+@pytest.mark.parametrize("version", sorted(RECIPES))
+def test_float16_round_trip_is_close(face_crop, version):
+    hist = compute_histograms(face_crop, [version])[version]
+    packed = pack_embedding(hist, "float16")
+    assert len(packed) < len(pack_embedding(hist, "float32"))
+    unpacked = unpack_embedding(packed)
+    assert unpacked.dtype == np.float32
+    assert np.allclose(unpacked, hist, atol=1e-3)
+
+def test_legacy_list_of_doubles_is_read(face_crop):
+    hist = compute_histograms(face_crop, [1])[1]
+    unpacked = unpack_embedding(hist.flatten().tolist())
+    assert unpacked.shape == tuple(HIST_BINS)
+    assert np.allclose(unpacked, hist)
+
+def test_unknown_encoding_is_rejected(face_crop):
+    packed = bytearray(pack_embedding(compute_histograms(face_crop, [1])[1]))
+    packed[0] = 99
+    with pytest.raises(ValueError):
+        unpack_embedding(bytes(packed))
+
+def test_staged_current_version_embeddings_win():
+    student = {
+        "faceEmbeddings": ["old"], "embeddingVersion": EMBEDDING_VERSION + 1,
+        VERSIONED_FIELD: {str(EMBEDDING_VERSION): ["staged"]},
+    }
+    assert stored_embeddings(student) == (EMBEDDING_VERSION, ["staged"])
+
+def test_primary_embeddings_keep_their_recorded_version(monkeypatch):
+    monkeypatch.setattr(face_embedding, "EMBEDDING_VERSION", 2)
+    student = {"faceEmbeddings": ["v1"], "embeddingVersion": 1, VERSIONED_FIELD: {"3": ["other"]}}
+    assert stored_embeddings(student) == (1, ["v1"])
+
+def test_legacy_single_embedding_is_version_one():
+    assert stored_embeddings({"faceEmbedding": "legacy"}) == (face_embedding.LEGACY_VERSION, ["legacy"])
+    assert stored_embeddings({}) == (face_embedding.LEGACY_VERSION, [])
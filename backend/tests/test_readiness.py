@@ -0,0 +1,38 @@
+from backend.readiness import Readiness
+
+def test_ready_only_once_every_component_finished():
+    readiness = Readiness("detectors", "gallery")
+    assert not readiness.is_ready()
+    readiness.start("detectors", total=2)
+    readiness.advance("detectors", 2)
+    readiness.finish("detectors")
+    assert not readiness.is_ready()
+    readiness.start("gallery")
+    readiness.finish("gallery")
+    assert readiness.is_ready()
+    assert readiness.status()["ready"]
+
+def test_progress_is_reported_per_component():
+    readiness = Readiness("gallery")
+    readiness.start("gallery")
+    assert readiness.status()["components"]["gallery"]["progress"] == 0.0
+    readiness.set_total("gallery", 4)
+    readiness.advance("gallery")
+    gallery = readiness.status()["components"]["gallery"]
+    assert gallery["state"] == "loading" and gallery["progress"] == 0.25
+
+def test_failure_keeps_instance_out_of_rotation():
+    readiness = Readiness("gallery")
+    readiness.start("gallery", total=3)
+    readiness.fail("gallery", RuntimeError("mongo down"))
+    gallery = readiness.status()["components"]["gallery"]
+    assert gallery["state"] == "failed" and gallery["error"] == "mongo down"
+    assert not readiness.is_ready()
+
+def test_reload_does_not_take_a_ready_instance_out():
+    readiness = Readiness("gallery")
+    readiness.start("gallery")
+    readiness.finish("gallery")
+    readiness.start("gallery", total=10)
+    assert readiness.is_ready()
+    assert readiness.status()["components"]["gallery"]["state"] == "loading"
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from backend import result_cache
+from backend.result_cache import ResultCache, cache_scope, frame_hash, hamming
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(result_cache.time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, size=(240, 320, 3), dtype=np.uint8)
+
+def test_near_identical_frames_hash_close(frame):
+    noisy = np.clip(frame.astype(np.int16) + 2, 0, 255).astype(np.uint8)
+    other = np.random.default_rng(1).integers(0, 256, size=frame.shape, dtype=np.uint8)
+    assert hamming(frame_hash(frame), frame_hash(noisy)) <= result_cache.MAX_DISTANCE
+    assert hamming(frame_hash(frame), frame_hash(other)) > result_cache.MAX_DISTANCE
+
+def test_results_are_not_shared_across_scopes(clock):
+    cache = ResultCache(size=8, ttl=2, max_distance=4)
+    cache.put(0b1010, 1, "tab one", scope="session:a")
+    assert cache.get(0b1010, 1, scope="session:a") == "tab one"
+    assert cache.get(0b1011, 1, scope="session:a") == "tab one" # Near-duplicate
+    assert cache.get(0b1010, 1, scope="session:b") is None
+    assert cache.get(0b1011, 1, scope="session:b") is None
+
+def test_entries_expire_after_ttl(clock):
+    cache = ResultCache(size=8, ttl=2, max_distance=4)
+    cache.put(0b1, 1, "result", scope="s")
+    clock[0] += 1.9
+    assert cache.get(0b1, 1, scope="s") == "result"
+    clock[0] += 0.2
+    assert cache.get(0b1, 1, scope="s") is None
+    assert cache.stats()["entries"] == 0
+
+def test_expired_neighbour_does_not_hide_a_live_one(clock):
+    cache = ResultCache(size=8, ttl=2, max_distance=4)
+    cache.put(0b0001, 1, "old", scope="s")
+    clock[0] += 1.5
+    cache.put(0b0011, 1, "new", scope="s")
+    cache.entries.move_to_end(("s", 0b0001)) # Scanned first
+    clock[0] += 1.0 # "old" expired, "new" still live
+    assert cache.get(0b0111, 1, scope="s") == "new"
+
+def test_gallery_version_change_drops_everything(clock):
+    cache = ResultCache(size=8, ttl=2, max_distance=4)
+    cache.put(0b1, 1, "result", scope="s")
+    assert cache.get(0b1, 2, scope="s") is None
+    assert cache.get(0b1, 1, scope="s") is None
+
+def test_lru_keeps_at_most_size_entries(clock):
+    cache = ResultCache(size=2, ttl=2, max_distance=0)
+    for key in (1, 2, 3):
+        cache.put(key << 20, 1, key, scope="s")
+    assert cache.get(1 << 20, 1, scope="s") is None
+    assert cache.get(3 << 20, 1, scope="s") == 3
+
+def test_scope_prefers_session_then_client_then_ip():
+    def request(headers, host="10.0.0.7"):
+        return SimpleNamespace(headers=headers, client=SimpleNamespace(host=host))
+    assert cache_scope(request({"x-session-id": "tab", "x-client-id": "kiosk"})) == "session:tab"
+    assert cache_scope(request({"x-client-id": "kiosk"})) == "client:kiosk"
+    assert cache_scope(request({})) == "ip:10.0.0.7"
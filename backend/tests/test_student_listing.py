@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from bson import ObjectId
+
+from backend.benchmarks.memory_mongo import AsyncMemoryCollection, MemoryDatabase
+from backend.student_listing import decode_cursor, encode_cursor, list_students
+
+def _students(docs):
+    collection = MemoryDatabase()["students"]
+    for doc in docs:
+        collection.insert_one(doc)
+    return AsyncMemoryCollection(collection)
+
+def _all_pages(collection, limit, **filters):
+    async def walk():
+        names, cursor = [], None
+        while True:
+            page = await list_students(collection, limit=limit, cursor=cursor, **filters)
+            names += [s["name"] for s in page["students"]]
+            cursor = page["nextCursor"]
+            if not cursor:
+                return names
+    return asyncio.run(walk())
+
+@pytest.mark.parametrize("roll_no", ["CS-101", "", None])
+def test_cursor_round_trip(roll_no):
+    oid = ObjectId()
+    doc = {"_id": oid} if roll_no is None else {"_id": oid, "rollNo": roll_no}
+    assert decode_cursor(encode_cursor(doc)) == (roll_no, oid)
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "", encode_cursor({"rollNo": 5, "_id": ObjectId()})])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+def test_pages_cover_every_student_once_in_roll_order():
+    collection = _students([{"name": f"s{i}", "rollNo": f"R{i:02d}"} for i in (5, 1, 9, 3, 7, 2, 8)])
+    assert _all_pages(collection, limit=3) == ["s1", "s2", "s3", "s5", "s7", "s8", "s9"]
+
+def test_pages_continue_past_students_without_roll_no():
+    docs = [{"name": f"missing{i}"} for i in range(4)] + [{"name": f"s{i}", "rollNo": f"R{i}"} for i in range(3)]
+    names = _all_pages(_students(docs), limit=2)
+    assert sorted(names) == sorted(d["name"] for d in docs)
+    assert len(names) == len(docs)
+    assert names[:4] == ["missing0", "missing1", "missing2", "missing3"] # Missing rollNo sorts first
+
+def test_filters_apply_across_pages():
+    docs = [{"name": f"it{i}", "rollNo": f"IT{i}", "department": "IT"} for i in range(5)]
+    docs += [{"name": f"me{i}", "rollNo": f"ME{i}", "department": "ME"} for i in range(5)]
+    collection = _students(docs)
+    assert _all_pages(collection, limit=2, department="IT") == [f"it{i}" for i in range(5)]
+    assert _all_pages(collection, limit=2, q="ME") == [f"me{i}" for i in range(5)]
+
+def test_listing_never_returns_embeddings():
+    collection = _students([{"name": "s", "rollNo": "R1", "faceEmbeddings": [b"x"]}])
+    page = asyncio.run(list_students(collection))
+    assert "faceEmbeddings" not in page["students"][0]
+    assert page["students"][0]["id"] == page["students"][0]["_id"]
@@ -0,0 +1,119 @@
+import os
+import argparse
+import hashlib
+
+import cv2
+import numpy as np
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+# Profile image thumbnails.
+# Enrollment writes WebP thumbnails at a few sizes next to the original profile JPEG.
+# File names carry a content hash, so the /thumbs route can serve them with a strong
+# ETag and a year-long immutable Cache-Control: a re-enrollment yields a new URL.
+#
+#   student["thumbnails"] = {"sm": "/thumbs/CS101_sm_1a2b3c4d5e.webp", "md": ..., "lg": ...}
+#
+# Backfill students enrolled before thumbnails existed with:
+#   python -m backend.thumbnails backfill
+
+THUMBNAIL_DIR = os.getenv("THUMBNAIL_DIR", "public/uploads/thumbs")
+# Longest side in pixels; sm fits 48px list avatars at 2x DPR, md the 128px live-check photo
+THUMBNAIL_SIZES = {"sm": 96, "md": 256, "lg": 512}
+WEBP_QUALITY = int(os.getenv("THUMBNAIL_WEBP_QUALITY", "80"))
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+URL_PREFIX = "/thumbs"
+
+def _resize(image, max_side):
+    height, width = image.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, round(width * scale)), max(1, round(height * scale))), interpolation=cv2.INTER_AREA)
+
+def make_thumbnails(image_bytes, key, out_dir=None):
+    """
+    Writes WebP thumbnails of an encoded image for every size in THUMBNAIL_SIZES.
+    Returns { size: url }, or {} if the bytes are not a decodable image.
+    """
+    out_dir = out_dir or THUMBNAIL_DIR
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        return {}
+
+    os.makedirs(out_dir, exist_ok=True)
+    delete_thumbnails(key, out_dir)
+    urls = {}
+    for size, max_side in THUMBNAIL_SIZES.items():
+        ok, encoded = cv2.imencode(".webp", _resize(image, max_side), [cv2.IMWRITE_WEBP_QUALITY, WEBP_QUALITY])
+        if not ok: continue
+        data = encoded.tobytes()
+        filename = f"{key}_{size}_{hashlib.sha1(data).hexdigest()[:10]}.webp"
+        tmp_path = os.path.join(out_dir, f".{filename}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, os.path.join(out_dir, filename))
+        urls[size] = f"{URL_PREFIX}/{filename}"
+    return urls
+
+def delete_thumbnails(key, out_dir=None):
+    out_dir = out_dir or THUMBNAIL_DIR
+    if not key or not os.path.isdir(out_dir):
+        return
+    prefixes = tuple(f"{key}_{size}_" for size in THUMBNAIL_SIZES)
+    for name in os.listdir(out_dir):
+        if name.startswith(prefixes) and name.endswith(".webp"):
+            try: os.remove(os.path.join(out_dir, name))
+            except OSError: pass
+
+def thumbnail_response(filename, request: Request, out_dir=None):
+    """
+    Serves one thumbnail with a strong ETag (its content hash) and immutable caching.
+    """
+    out_dir = out_dir or THUMBNAIL_DIR
+    if os.path.basename(filename) != filename or not filename.endswith(".webp"):
+        return Response(status_code=404)
+    path = os.path.join(out_dir, filename)
+    if not os.path.isfile(path):
+        return Response(status_code=404)
+
+    etag = '"' + filename.rsplit("_", 1)[-1][:-len(".webp")] + '"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+# ==== BACKFILL ====
+
+def backfill(upload_dir="public/uploads"):
+    """
+    Generates thumbnails for students that have a profile image but no thumbnails yet.
+    """
+    from .database import students_collection
+
+    done = 0
+    query = {"profileImage": {"$exists": True, "$nin": ["", None]}, "thumbnails": {"$exists": False}}
+    for student in students_collection.find(query, {"rollNo": 1, "profileImage": 1}):
+        path = os.path.join(upload_dir, os.path.basename(student["profileImage"]))
+        if not os.path.exists(path):
+            print(f"[WARNING] Missing profile image for {student.get('rollNo')}: {path}")
+            continue
+        with open(path, "rb") as f:
+            urls = make_thumbnails(f.read(), student.get("rollNo") or str(student["_id"]))
+        if urls:
+            students_collection.update_one({"_id": student["_id"]}, {"$set": {"thumbnails": urls}})
+            done += 1
+    print(f"[INFO] Generated thumbnails for {done} students.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile image thumbnails")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fill = sub.add_parser("backfill", help="Create thumbnails for students enrolled without them")
+    fill.add_argument("--upload-dir", default="public/uploads")
+    args = parser.parse_args()
+    if args.command == "backfill":
+        backfill(args.upload_dir)
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,8 @@ import { useRef } from "react";
 
 export default function ManageStudentsPage() {
   const [students, setStudents] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [search, setSearch] = useState("");
   const [loading, setLoading] = useState(false);
   const [isModalOpen, setIsModalOpen] = useState(false);
   const [isEditMode, setIsEditMode] = useState(false);
@@ -33,10 +35,14 @@ export default function ManageStudentsPage() {
     fetchStudents();
   }, []);
 
-  const fetchStudents = async () => {
+  // Paginated: the first page replaces the list, "Load more" appends the next one
+  const fetchStudents = async (cursor: string | null = null) => {
     try {
-      const res = await api.get(endpoints.students.getAll);
-      setStudents(res.data);
+      const res = await api.get(endpoints.students.getAll, {
+        params: { limit: 50, cursor: cursor || undefined, q: search || undefined },
+      });
+      setStudents((prev) => (cursor ? [...prev, ...res.data.students] : res.data.students));
+      setNextCursor(res.data.nextCursor);
     } catch (err) {
       console.error(err);
     }
@@ -128,6 +134,21 @@ export default function ManageStudentsPage() {
     <div className="p-6 h-full">
       <div className="flex justify-between items-center mb-6">
         <SectionTitle title="Manage Students" />
+        <form
+          onSubmit={(e) => { e.preventDefault(); fetchStudents(); }}
+          className="join ml-auto mr-3"
+        >
+          <input
+            type="text"
+            placeholder="Roll No / Name prefix"
+            className="input input-bordered join-item"
+            value={search}
+            onChange={(e) => setSearch(e.target.value)}
+          />
+          <button type="submit" className="btn join-item">
+            <IconSearch size={18} />
+          </button>
+        </form>
         <button
           onClick={openAddModal}
           className="btn btn-primary bg-teal-600 border-none hover:bg-teal-700 text-white gap-2"
@@ -157,7 +178,7 @@ export default function ManageStudentsPage() {
                       <div className="mask mask-squircle w-12 h-12 bg-gray-100">
                         {student.profileImage ? (
                           <img
-                            src={`http://localhost:8001${student.profileImage}`}
+                            src={`http://localhost:8001${student.thumbnails?.sm || student.profileImage}`}
                             alt={student.name}
                             onError={(e) => (e.currentTarget.src = 'https://ui-avatars.com/api/?name=' + student.name)}
                           />
@@ -204,6 +225,13 @@ export default function ManageStudentsPage() {
             </tbody>
           </table>
         </div>
+        {nextCursor && (
+          <div className="p-4 text-center">
+            <button onClick={() => fetchStudents(nextCursor)} className="btn btn-ghost btn-sm">
+              Load more
+            </button>
+          </div>
+        )}
       </div>
 
       {/* Modal */}
@@ -1,6 +1,7 @@
 "use client";
 import { useEffect, useRef, useState, useCallback } from "react";
 import Webcam from "react-webcam";
+import axios from "axios";
 import { api, endpoints } from "@/lib/api";
 import { IconUser, IconScan, IconCheck, IconX } from "@tabler/icons-react";
 
@@ -10,6 +11,9 @@ export default function LiveCheckPage() {
     const [lastCheckTime, setLastCheckTime] = useState(0);
     const [matchResult, setMatchResult] = useState<any>(null);
     const [errorMsg, setErrorMsg] = useState("");
+    // Newer frames from this session supersede older ones on the backend (latest frame wins)
+    const sessionIdRef = useRef(Math.random().toString(36).slice(2) + Date.now().toString(36));
+    const inFlightRef = useRef<AbortController | null>(null);
 
     const captureAndCheck = useCallback(async () => {
         if (!webcamRef.current || !isScanning) return;
@@ -23,8 +27,16 @@ export default function LiveCheckPage() {
 
         setLastCheckTime(now);
 
+        // Drop the previous frame if it is still pending; nobody needs its answer anymore
+        inFlightRef.current?.abort();
+        const controller = new AbortController();
+        inFlightRef.current = controller;
+
         try {
-            const res = await api.post(endpoints.attendance.recognize, { image: imageSrc });
+            const res = await api.post(endpoints.attendance.recognize, { image: imageSrc }, {
+                headers: { "X-Session-Id": sessionIdRef.current },
+                signal: controller.signal,
+            });
 
             if (res.data.status === "success") {
                 setMatchResult(res.data.student);
@@ -41,7 +53,9 @@ export default function LiveCheckPage() {
                     setErrorMsg("");
                 }
             }
-        } catch (err) {
+        } catch (err: any) {
+            // Superseded (aborted here, or 409 from the backend) and busy (503) frames are expected
+            if (axios.isCancel(err) || err?.response?.status === 409 || err?.response?.status === 503) return;
             console.error(err);
         }
     }, [isScanning, lastCheckTime]);
@@ -51,6 +65,8 @@ export default function LiveCheckPage() {
         return () => clearInterval(interval);
     }, [captureAndCheck]);
 
+    useEffect(() => () => inFlightRef.current?.abort(), []);
+
     return (
         <div className="min-h-screen bg-gray-900 flex flex-col items-center justify-center p-4">
             <div className="w-full max-w-4xl grid grid-cols-1 md:grid-cols-2 gap-8 items-center">
@@ -81,7 +97,7 @@ export default function LiveCheckPage() {
                         <div className="space-y-6 animate-fade-in">
                             <div className="w-32 h-32 mx-auto rounded-full p-1 bg-gradient-to-tr from-green-400 to-teal-500 relative">
                                 <img
-                                    src={matchResult.profileImage ? `http://localhost:8001${matchResult.profileImage}` : "https://ui-avatars.com/api/?name=" + matchResult.name}
+                                    src={matchResult.profileImage ? `http://localhost:8001${matchResult.thumbnail || matchResult.profileImage}` : "https://ui-avatars.com/api/?name=" + matchResult.name}
                                     className="w-full h-full rounded-full object-cover border-4 border-gray-800"
                                 />
                                 <div className="absolute bottom-0 right-0 bg-green-500 text-white p-2 rounded-full border-4 border-gray-800">
@@ -109,7 +109,7 @@ export default function StudentDashboardPage() {
                         <div className="avatar">
                             <div className="w-24 h-24 rounded-full ring ring-teal-600 ring-offset-base-100 ring-offset-2">
                                 {profile.profileImage ? (
-                                    <img src={`http://localhost:8001${profile.profileImage}`} alt="Profile" />
+                                    <img src={`http://localhost:8001${profile.thumbnails?.md || profile.profileImage}`} alt="Profile" />
                                 ) : (
                                     <div className="bg-gray-200 w-full h-full flex items-center justify-center text-2xl font-bold text-gray-500">
                                         {profile.name[0]}